@@ -0,0 +1,602 @@
+# ================================================
+# ReadEasy Mini Library Management System
+#
+# PROG211 - Individual Assignment
+# Student: Joshua Mohamed Katibi Yaffa
+# ID: 905004075
+# Class: BSEM1101
+# Semester: 3
+# Year: 2
+#
+# Performance Benchmarks
+#
+# GitHub: JoshuaYaffa/SmartLibrary-Group-I
+# ================================================
+
+"""
+This file contains benchmarks for the busiest parts of the system.
+
+The benchmark suite builds a synthetic library (10 thousand to 1 million
+books, up to 500 thousand members), borrows books with a skewed Zipf
+pattern so a few titles are very popular, and times searching, borrowing,
+returning, the system summary, audit logging and log viewing. Results can
+be written as JSON and compared against a stored baseline; the run fails
+if anything got slower than the baseline allows.
+
+Run with:
+    python benchmarks.py                        (suite, 10k books)
+    python benchmarks.py --books 1000000 --json results.json
+    python benchmarks.py --save-baseline        (store a new baseline)
+    python benchmarks.py --extra                (also the one-off benchmarks)
+"""
+
+import argparse
+import bisect
+import contextlib
+import gc
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import metrics
+import operations
+import security
+import storage
+
+# Baseline the suite is compared against, next to this file
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+REGRESSION_TOLERANCE = 0.25   # Allowed slowdown before a result counts as a regression
+
+
+# ==============================
+# Helper Functions
+# ==============================
+
+def time_per_call(func, args_list):
+    """Runs func once for every argument tuple and returns seconds per call."""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+
+def report(label, seconds):
+    """Prints one timing in microseconds per call."""
+    print("{:<30} {:>10.2f} us/call".format(label + ":", seconds * 1e6))
+
+
+# ==============================
+# Member Loan Benchmark
+# ==============================
+
+def bench_member_loans(loans=10000, sample=1000):
+    """
+    Times borrow_book and return_book for a single member holding many loans.
+    The first and last batches of loans should cost about the same; with a
+    list of loans the last batch was much slower than the first.
+    """
+    isbns = [f"BENCH{n:07d}" for n in range(loans)]
+    for isbn in isbns:
+        operations.add_book(isbn, f"Bench Title {isbn}", "Bench Author", "Bench", 1)
+    operations.add_member("BENCH-M", "Bench Member", "bench@example.com")
+
+    first = time_per_call(operations.borrow_book, [(isbn, "BENCH-M") for isbn in isbns[:sample]])
+    for isbn in isbns[sample:-sample]:
+        operations.borrow_book(isbn, "BENCH-M")
+    last = time_per_call(operations.borrow_book, [(isbn, "BENCH-M") for isbn in isbns[-sample:]])
+    returned = time_per_call(operations.return_book, [(isbn, "BENCH-M") for isbn in isbns[-sample:]])
+
+    # The old list-based loans for comparison, returning the newest loans
+    loan_list = list(isbns)
+    start = time.perf_counter()
+    for isbn in isbns[-sample:]:
+        if isbn in loan_list:
+            loan_list.remove(isbn)
+    list_returned = (time.perf_counter() - start) / sample
+
+    operations.delete_member("BENCH-M")
+    for isbn in isbns:
+        operations.delete_book(isbn)
+
+    print(f"\n=== Member Loans ({loans} loans) ===")
+    report("Borrow, first loans", first)
+    report("Borrow, last loans", last)
+    report("Return with LoanSet", returned)
+    report("Return with a plain list", list_returned)
+    return {"borrow_first": first, "borrow_last": last,
+            "return": returned, "return_list": list_returned}
+
+
+# ==============================
+# Record Memory Report
+# ==============================
+
+def measure_bytes(build):
+    """Returns the bytes still allocated by the objects that build() returns."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return after - before
+
+
+def memory_report(count=1000000):
+    """
+    Compares the memory used by one million books stored as dictionaries
+    (the old format) against the same books stored as Book records.
+    The field values are shared by both so only the records are measured.
+    """
+    titles = [f"Synthetic Title {n}" for n in range(count)]
+    author, genre = "Synthetic Author", "Synthetic"
+
+    dict_bytes = measure_bytes(lambda: {
+        str(n): {"title": titles[n], "author": author, "genre": genre,
+                 "total_copies": 3, "available_copies": 3}
+        for n in range(count)
+    })
+    record_bytes = measure_bytes(lambda: {
+        str(n): operations.Book(titles[n], author, genre, 3)
+        for n in range(count)
+    })
+
+    print(f"\n=== Memory per Book ({count} books) ===")
+    print("{:<30} {:>10.1f} bytes/record".format("Dictionary records:", dict_bytes / count))
+    print("{:<30} {:>10.1f} bytes/record".format("Book records (__slots__):", record_bytes / count))
+    return {"dict": dict_bytes / count, "slots": record_bytes / count}
+
+
+# ==============================
+# Audit Log Benchmark
+# ==============================
+
+def bench_logging(events=20000):
+    """
+    Measures how many audit events per second log_event can record in each
+    log mode. Events go to a temporary file instead of the real audit log.
+    """
+    results = {}
+    real_log, real_mode = security.audit_log, security.LOG_MODE
+    with tempfile.TemporaryDirectory() as folder:
+        for mode in security.LOG_MODES:
+            security.set_log_mode(mode)
+            security.audit_log = security.LogWriter(os.path.join(folder, f"{mode}.txt"))
+            start = time.perf_counter()
+            for n in range(events):
+                security.log_event("bench", f"Borrowed book {n}")
+            security.flush_logs()
+            results[mode] = events / (time.perf_counter() - start)
+    security.audit_log = real_log
+    security.set_log_mode(real_mode)
+
+    print(f"\n=== Audit Logging ({events} events) ===")
+    for mode, rate in results.items():
+        print("{:<30} {:>10.0f} events/sec".format(mode.capitalize() + " mode:", rate))
+    return results
+
+
+# ==============================
+# Bulk Import Benchmark
+# ==============================
+
+def bench_bulk_import(rows=200000):
+    """Measures how many catalog rows per second bulk_add_books imports from CSV."""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "catalog.csv")
+        with open(path, "w", encoding="utf-8") as catalog:
+            catalog.write("isbn,title,author,genre,total_copies\n")
+            for n in range(rows):
+                catalog.write(f"IMPORT{n:09d},Imported Title {n % 9973},Author {n % 4001},Genre {n % 50},{n % 7}\n")
+
+        start = time.perf_counter()
+        report = operations.bulk_add_books(path)
+        elapsed = time.perf_counter() - start
+
+    for n in range(rows):
+        operations.delete_book(f"IMPORT{n:09d}")
+
+    print(f"\n=== Bulk Import ({rows} rows) ===")
+    print("{:<30} {:>10.0f} rows/sec".format("bulk_add_books from CSV:", report["added"] / elapsed))
+    return {"rows_per_sec": report["added"] / elapsed}
+
+
+# ==============================
+# Cold Start Benchmark
+# ==============================
+
+def bench_cold_start(book_count=1000000, member_count=200000, tail=50000):
+    """
+    Measures how long each storage backend takes to load a large library
+    from disk. The journal backend loads a snapshot and replays a journal
+    tail of the given number of loans.
+    """
+    library_books = {
+        f"{n:013d}": operations.Book(f"Cold Title {n}", f"Author {n % 5000}", "Genre", 3)
+        for n in range(book_count)
+    }
+    library_members = {
+        f"M{n:07d}": operations.Member(f"Member {n}", f"member{n}@example.com")
+        for n in range(member_count)
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        journal = storage.JournalStorage(os.path.join(folder, "journal"), snapshot_every=tail + 1)
+        journal.save_all(library_books, library_members)
+        for n in range(tail):
+            journal.borrow(f"{n % book_count:013d}", f"M{n % member_count:07d}")
+        journal.close()
+
+        database = storage.SQLiteStorage(os.path.join(folder, "library.db"))
+        database.save_all(library_books, library_members)
+        database.close()
+
+        start = time.perf_counter()
+        book_rows, _, loan_rows = storage.JournalStorage(os.path.join(folder, "journal")).load()
+        results["journal"] = time.perf_counter() - start
+        assert len(book_rows) == book_count and len(loan_rows) == tail
+
+        start = time.perf_counter()
+        database = storage.SQLiteStorage(os.path.join(folder, "library.db"))
+        database.load()
+        database.close()
+        results["sqlite"] = time.perf_counter() - start
+
+    print(f"\n=== Cold Start ({book_count} books, {member_count} members) ===")
+    print("{:<30} {:>10.2f} seconds".format("Snapshot + journal tail:", results["journal"]))
+    print("{:<30} {:>10.2f} seconds".format("SQLite database:", results["sqlite"]))
+    return results
+
+
+# ==============================
+# Thread Scaling Benchmark
+# ==============================
+
+def bench_thread_scaling(thread_counts=(1, 2, 4, 8), operations_per_thread=20000):
+    """
+    Measures borrow and return operations per second with several threads
+    working on different books at once. Python only runs one thread at a
+    time, so this shows how little the locks cost rather than a speed-up;
+    with the old code the totals could go wrong once threads were added.
+    """
+    isbns = [f"THREAD{n:05d}" for n in range(256)]
+    for isbn in isbns:
+        operations.add_book(isbn, f"Thread Title {isbn}", "Thread Author", "Thread", 2)
+    for number in range(max(thread_counts)):
+        operations.add_member(f"THREAD-M{number}", "Thread Member", "thread@example.com")
+
+    def desk(number, count):
+        member_id = f"THREAD-M{number}"
+        for n in range(count // 2):
+            isbn = isbns[(number * 31 + n) % len(isbns)]
+            operations.borrow_book(isbn, member_id)
+            operations.return_book(isbn, member_id)
+
+    results = {}
+    for threads in thread_counts:
+        workers = [threading.Thread(target=desk, args=(number, operations_per_thread))
+                   for number in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        results[threads] = threads * operations_per_thread / (time.perf_counter() - start)
+
+    for number in range(max(thread_counts)):
+        operations.delete_member(f"THREAD-M{number}")
+    for isbn in isbns:
+        operations.delete_book(isbn)
+
+    print("\n=== Thread Scaling (borrow + return) ===")
+    for threads, rate in results.items():
+        print("{:<30} {:>10.0f} ops/sec".format(f"{threads} thread(s):", rate))
+    return results
+
+
+# ==============================
+# Login Benchmark
+# ==============================
+
+def bench_login(costs=(2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15), logins=10):
+    """
+    Measures logins per second for several scrypt cost settings, both with
+    the slow password check every time and with repeat logins answered by
+    the login cache. Useful for choosing security.SCRYPT_COST.
+    """
+    results = {}
+    for cost in costs:
+        security.USERS["bench"] = {
+            "password_hash": security.hash_password(
+                "bench-pass", "scrypt", (cost, security.SCRYPT_BLOCK_SIZE, security.SCRYPT_PARALLEL)),
+            "role": "staff",
+        }
+        rates = {}
+        for cached in (False, True):
+            security.login_cache.clear()
+            security.login_cache.check("bench", "bench-pass", security.USERS["bench"]["password_hash"])
+            start = time.perf_counter()
+            for _ in range(logins):
+                if not cached:
+                    security.login_cache.clear()
+                session = security.login("bench", "bench-pass", "staff")
+                security.sessions.end(session.token)
+            rates[cached] = logins / (time.perf_counter() - start)
+        results[cost] = {"uncached": rates[False], "cached": rates[True]}
+    del security.USERS["bench"]
+    security.login_cache.clear()
+
+    print(f"\n=== Login Throughput ({logins} logins per setting) ===")
+    for cost, rates in results.items():
+        print("{:<30} {:>10.1f} logins/sec".format(f"scrypt n={cost}:", rates["uncached"]))
+        print("{:<30} {:>10.0f} logins/sec".format(f"scrypt n={cost}, cached:", rates["cached"]))
+    return results
+
+
+# ==============================
+# Metrics Overhead Benchmark
+# ==============================
+
+def bench_metrics_overhead(calls=200000):
+    """Measures what metrics.timed adds to each call, switched on and off."""
+    def plain(value):
+        return value
+
+    timed = metrics.timed("bench.overhead")(plain)
+    was_enabled = metrics.ENABLED
+    args_list = [(n,) for n in range(calls)]
+    base = time_per_call(plain, args_list)
+    metrics.enable()
+    enabled = time_per_call(timed, args_list)
+    metrics.disable()
+    disabled = time_per_call(timed, args_list)
+    if was_enabled:
+        metrics.enable()
+    metrics.registry.pop("bench.overhead", None)
+
+    print(f"\n=== Metrics Overhead ({calls} calls) ===")
+    report("Added when switched on", enabled - base)
+    report("Added when switched off", disabled - base)
+    return {"enabled": enabled - base, "disabled": disabled - base}
+
+
+# ==============================
+# Synthetic Library
+# ==============================
+
+WORDS = ("river", "shadow", "garden", "empire", "winter", "silver", "stone", "ocean",
+         "forest", "night", "crown", "storm", "glass", "iron", "dream", "letter",
+         "island", "mountain", "city", "fire", "secret", "journey", "song", "house")
+GENRES = ("Fantasy", "Fiction", "Drama", "Classic", "Science Fiction", "Romance",
+          "History", "Poetry", "Mystery", "Biography")
+
+
+def make_catalog(book_count, member_count, seed=0):
+    """Returns (book rows, member rows) for load_state, the same for the same seed."""
+    rng = random.Random(seed)
+    authors = [f"{rng.choice(WORDS).title()} Author{n}" for n in range(max(1, book_count // 20))]
+    book_rows = []
+    for n in range(book_count):
+        title = " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(2, 4)))
+        copies = rng.randint(1, 5)
+        book_rows.append((f"{n:013d}", f"{title} {n}", rng.choice(authors),
+                          rng.choice(GENRES), copies, copies))
+    member_rows = [(f"M{n:07d}", f"Member {n}", f"member{n}@example.com")
+                   for n in range(member_count)]
+    return book_rows, member_rows
+
+
+def zipf_sampler(count, exponent, rng):
+    """Returns a function picking 0..count-1, where item k is picked in proportion to 1/(k+1)**exponent."""
+    totals = list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+    last = totals[-1]
+    return lambda: bisect.bisect_left(totals, rng.random() * last)
+
+
+def library_rows():
+    """Returns the current library as rows for load_state, so it can be put back."""
+    book_rows = [(isbn, book.title, book.author, book.genre, book.total_copies, book.available_copies)
+                 for isbn, book in operations.books.items()]
+    member_rows = [(member_id, member.name, member.email)
+                   for member_id, member in operations.members.items()]
+    loan_rows = [(isbn, member_id) for member_id, member in operations.members.items()
+                 for isbn in member.borrowed_books]
+    return book_rows, member_rows, loan_rows
+
+
+# ==============================
+# Benchmark Suite
+# ==============================
+
+def measure(func, args_list):
+    """Runs func for every argument tuple and returns operations per second and us per operation."""
+    seconds = time_per_call(func, args_list)
+    return {"ops_per_sec": 1 / seconds, "us_per_op": seconds * 1e6}
+
+
+def run_suite(book_count=10000, member_count=5000, zipf_exponent=1.1, seed=0,
+              searches=2000, loans=20000, log_events=20000):
+    """
+    Builds a synthetic library and times the hot paths. The real library
+    data, storage backend and audit log are put back afterwards.
+    Returns {"settings": {...}, "results": {name: {"ops_per_sec", "us_per_op"}}}.
+    """
+    rng = random.Random(seed)
+    saved_rows, saved_store = library_rows(), operations.store
+    saved_log, saved_mode = security.audit_log, security.LOG_MODE
+    results = {}
+    try:
+        operations.store = storage.MemoryStorage()
+        start = time.perf_counter()
+        book_rows, member_rows = make_catalog(book_count, member_count, seed)
+        operations.load_state(book_rows, member_rows, [])
+        results["load_catalog"] = {"seconds": time.perf_counter() - start}
+
+        isbns = [row[0] for row in book_rows]
+        member_ids = [row[0] for row in member_rows]
+        popular = zipf_sampler(len(isbns), zipf_exponent, rng)
+
+        queries = [(" ".join(rng.sample(WORDS, rng.randint(1, 2))),) for _ in range(searches)]
+        queries += [(rng.choice(book_rows)[2].split()[1],) for _ in range(searches // 4)]
+        # Uncached first, so the figure stays comparable with older baselines
+        saved_cache_size, operations.SEARCH_CACHE_SIZE = operations.SEARCH_CACHE_SIZE, 0
+        try:
+            results["search_books"] = measure(operations.search_books, queries)
+        finally:
+            operations.SEARCH_CACHE_SIZE = saved_cache_size
+        operations.clear_search_cache()
+        results["search_books_cached"] = measure(operations.search_books, queries)
+
+        # Title words with one letter changed, as a patron might mistype them
+        typos = []
+        for _ in range(searches // 4):
+            word = rng.choice(rng.choice(book_rows)[1].split()).lower()
+            spot = rng.randrange(len(word))
+            typos.append((word[:spot] + rng.choice("aeiou") + word[spot + 1:], True))
+        results["search_books_fuzzy"] = measure(operations.search_books, typos)
+
+        borrows = [(isbns[popular()], rng.choice(member_ids)) for _ in range(loans)]
+        results["borrow_book"] = measure(operations.borrow_book, borrows)
+        rng.shuffle(borrows)
+        results["return_book"] = measure(operations.return_book, borrows)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            results["system_summary"] = measure(operations.system_summary, [()] * 1000)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "audit_log.txt")
+            security.set_log_mode("buffered")
+            security.audit_log = security.LogWriter(path, indexed=True)
+            users = [f"user{n}" for n in range(50)]
+            events = [(rng.choice(users), f"Borrowed book {n}") for n in range(log_events)]
+            start = time.perf_counter()
+            for username, action in events:
+                security.log_event(username, action)
+            security.flush_logs()
+            elapsed = time.perf_counter() - start
+            results["log_event"] = {"ops_per_sec": log_events / elapsed,
+                                    "us_per_op": elapsed / log_events * 1e6}
+
+            results["read_log_user"] = measure(
+                lambda username: sum(1 for _ in security.read_log(path, user=username)),
+                [(rng.choice(users),) for _ in range(20)])
+            results["read_log_tail"] = measure(
+                lambda count: list(security.read_log(path, tail=count)), [(50,)] * 20)
+    finally:
+        security.audit_log = saved_log
+        security.set_log_mode(saved_mode)
+        operations.load_state(*saved_rows)
+        operations.store = saved_store
+
+    settings = {"books": book_count, "members": member_count, "zipf": zipf_exponent,
+                "seed": seed, "python": sys.version.split()[0]}
+    return {"settings": settings, "results": results}
+
+
+def find_regressions(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares per-operation times against a baseline report made with the
+    same settings. Returns (name, baseline us, current us) for each result
+    more than tolerance slower than the baseline.
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name, {}).get("us_per_op")
+        if before is not None and "us_per_op" in result:
+            if result["us_per_op"] > before * (1 + tolerance):
+                regressions.append((name, before, result["us_per_op"]))
+    return regressions
+
+
+def print_suite(report):
+    """Prints the results of run_suite as a table."""
+    settings = report["settings"]
+    print(f"\n=== Benchmark Suite ({settings['books']} books, {settings['members']} members) ===")
+    for name, result in report["results"].items():
+        if "us_per_op" in result:
+            print("{:<30} {:>10.2f} us/op {:>12.0f} ops/sec".format(
+                name + ":", result["us_per_op"], result["ops_per_sec"]))
+        else:
+            print("{:<30} {:>10.2f} seconds".format(name + ":", result["seconds"]))
+
+
+def run_extra_benchmarks():
+    """Runs the one-off benchmarks kept from earlier performance work."""
+    bench_member_loans()
+    memory_report()
+    bench_logging()
+    bench_bulk_import()
+    bench_cold_start()
+    bench_thread_scaling()
+    bench_login()
+    bench_metrics_overhead()
+
+
+def main(argv=None):
+    """Command line entry point. Returns the exit status, 1 if a regression was found."""
+    parser = argparse.ArgumentParser(description="Benchmarks for the ReadEasy library system.")
+    parser.add_argument("--books", type=int, default=10000, help="books in the synthetic catalog")
+    parser.add_argument("--members", type=int, default=None,
+                        help="members in the synthetic library (default: half the books, at most 500000)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="skew of the borrowing pattern")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic data")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", metavar="PATH", default=BASELINE_FILE,
+                        help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="allowed slowdown, e.g. 0.25 for 25%%")
+    parser.add_argument("--extra", action="store_true", help="also run the one-off benchmarks")
+    args = parser.parse_args(argv)
+
+    members = args.members if args.members is not None else min(args.books // 2, 500000)
+    report = run_suite(args.books, members, args.zipf, args.seed)
+    print_suite(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    if args.extra:
+        run_extra_benchmarks()
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline found; run with --save-baseline to store one.")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as stored:
+        baseline = json.load(stored)
+    if baseline["settings"]["books"] != report["settings"]["books"] or \
+            baseline["settings"]["members"] != report["settings"]["members"]:
+        print("\nBaseline was made with a different library size; not compared.")
+        return 0
+
+    regressions = find_regressions(report, baseline, args.tolerance)
+    for name, before, after in regressions:
+        print(f"REGRESSION {name}: {before:.2f} -> {after:.2f} us/op")
+    if not regressions:
+        print("\nNo regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+# ==============================
+# Run All Benchmarks
+# ==============================
+
+if __name__ == "__main__":
+    print("=====================================")
+    print(" Running Benchmarks for ReadEasy ")
+    print("=====================================")
+    sys.exit(main())
@@ -19,7 +19,13 @@ It integrates the operations and security modules, providing a role-based
 menu for Admins, Staff, and Members.
 """
 
+import os
+import sys
+import metrics
+import operations
+import profiling
 import security
+import storage
 from operations import (
     add_book, update_book, delete_book, search_books,
     add_member, update_member, delete_member,
@@ -28,30 +34,130 @@ from operations import (
 )
 
 
+# Number of log records shown before pausing
+LOG_PAGE_SIZE = 20
+
+# Set to 1 to profile the session and write a report on logout (see
+# profiling.py). Running "python demo.py --profile" does the same.
+PROFILE_ENV = "READEASY_PROFILE"
+profiler = None   # The running profiling.SessionProfiler, if any
+
+# Menu choices and their names
+ADMIN_MENU = {
+    "1": "Add Book",
+    "2": "Update Book",
+    "3": "Delete Book",
+    "4": "Add Member",
+    "5": "Update Member",
+    "6": "Delete Member",
+    "7": "View All Books",
+    "8": "View All Members",
+    "9": "Borrow Book",
+    "10": "Return Book",
+    "11": "System Summary",
+    "12": "View Audit Log",
+    "13": "View Error Log",
+    "14": "View Performance Metrics",
+    "0": "Logout",
+}
+STAFF_MENU = {
+    "1": "View All Books",
+    "2": "View All Members",
+    "3": "Borrow Book",
+    "4": "Return Book",
+    "5": "System Summary",
+    "0": "Logout",
+}
+MEMBER_MENU = {
+    "1": "View All Books",
+    "2": "Borrow Book",
+    "3": "Return Book",
+    "0": "Logout",
+}
+
+# Permission needed for each menu choice (see security.ROLE_PERMISSIONS)
+ADMIN_CHOICES = {
+    "1": "manage_books", "2": "manage_books", "3": "manage_books",
+    "4": "manage_members", "5": "manage_members", "6": "manage_members",
+    "7": "view_books", "8": "view_members", "9": "borrow", "10": "return",
+    "11": "view_summary", "12": "view_logs", "13": "view_logs", "14": "view_metrics",
+}
+STAFF_CHOICES = {
+    "1": "view_books", "2": "view_members", "3": "borrow", "4": "return",
+    "5": "view_summary",
+}
+MEMBER_CHOICES = {"1": "view_books", "2": "borrow", "3": "return"}
+
+
+# ==============================
+# HELPER FUNCTIONS
+# ==============================
+
+def ask_log_filters():
+    """Asks the admin how to narrow down the log records to display."""
+    since = input("From date/time, e.g. 2025-10-16 or 2025-10-16 10:00 (blank for all): ").strip() or None
+    until = input("To date/time (blank for all): ").strip() or None
+    tail = input("Show only the last N records (blank for all): ").strip()
+    try:
+        tail = int(tail) if tail else None
+    except ValueError:
+        print("Invalid number. Showing all records.")
+        tail = None
+    return since, until, tail
+
+
+def show_menu(title, items):
+    """Prints a menu's title and numbered choices."""
+    print(f"\n=== {title} ===")
+    for key, name in items.items():
+        print(f"{key}. {name}")
+
+
+def profile_action(items, choice):
+    """Starts timing a menu choice when the session is being profiled."""
+    if profiler is not None:
+        profiler.start_action(f"{choice}. {items.get(choice, 'Invalid choice')}")
+
+
+def profile_action_done():
+    """Stops timing the current menu choice when the session is being profiled."""
+    if profiler is not None:
+        profiler.end_action()
+
+
+def session_active(session):
+    """Returns True if the session is still open, telling the user if it expired."""
+    # Looking the session up also counts as activity for its expiry time
+    if security.sessions.get(session.token) is None:
+        print("Your session has expired. Please log in again.")
+        return False
+    return True
+
+
+def check_access(session, permission):
+    """Returns True if the session may do something, explaining why not otherwise."""
+    if security.has_access(permission, session):
+        return True
+    print(f"Access denied. This action requires the {permission} permission.")
+    return False
+
+
 # ==============================
 # ADMIN MENU
 # ==============================
 
-def admin_menu():
+def admin_menu(session):
     """Displays available actions for admin users."""
     while True:
-        print("\n=== ADMIN MENU ===")
-        print("1. Add Book")
-        print("2. Update Book")
-        print("3. Delete Book")
-        print("4. Add Member")
-        print("5. Update Member")
-        print("6. Delete Member")
-        print("7. View All Books")
-        print("8. View All Members")
-        print("9. Borrow Book")
-        print("10. Return Book")
-        print("11. System Summary")
-        print("12. View Audit Log")
-        print("13. View Error Log")
-        print("0. Logout")
+        profile_action_done()
+        if not session_active(session):
+            break
+        show_menu("ADMIN MENU", ADMIN_MENU)
 
         choice = input("Enter your choice: ").strip()
+        profile_action(ADMIN_MENU, choice)
+        if choice in ADMIN_CHOICES and not check_access(session, ADMIN_CHOICES[choice]):
+            continue
 
         if choice == "1":
             isbn = input("Enter ISBN: ")
@@ -138,13 +244,21 @@ def admin_menu():
             system_summary()
 
         elif choice == "12":
-            security.view_audit_log()
+            user = input("Filter by username (blank for all): ").strip() or None
+            since, until, tail = ask_log_filters()
+            security.view_audit_log(session, user, since, until, tail, page_size=LOG_PAGE_SIZE)
 
         elif choice == "13":
-            security.view_error_log()
+            since, until, tail = ask_log_filters()
+            security.view_error_log(session, since, until, tail, page_size=LOG_PAGE_SIZE)
+
+        elif choice == "14":
+            fmt = input("Show as text or json? (text/json): ").strip().lower()
+            print("\n=== Performance Metrics ===")
+            print(metrics.report_json() if fmt == "json" else metrics.report_text())
 
         elif choice == "0":
-            security.logout()
+            security.logout(session)
             break
 
         else:
@@ -155,18 +269,18 @@ def admin_menu():
 # STAFF MENU
 # ==============================
 
-def staff_menu():
+def staff_menu(session):
     """Displays options available for staff users."""
     while True:
-        print("\n=== STAFF MENU ===")
-        print("1. View All Books")
-        print("2. View All Members")
-        print("3. Borrow Book")
-        print("4. Return Book")
-        print("5. System Summary")
-        print("0. Logout")
+        profile_action_done()
+        if not session_active(session):
+            break
+        show_menu("STAFF MENU", STAFF_MENU)
 
         choice = input("Enter your choice: ").strip()
+        profile_action(STAFF_MENU, choice)
+        if choice in STAFF_CHOICES and not check_access(session, STAFF_CHOICES[choice]):
+            continue
 
         if choice == "1":
             pretty_print_books()
@@ -189,7 +303,7 @@ def staff_menu():
         elif choice == "5":
             system_summary()
         elif choice == "0":
-            security.logout()
+            security.logout(session)
             break
         else:
             print("Invalid choice. Try again.")
@@ -199,16 +313,18 @@ def staff_menu():
 # MEMBER MENU
 # ==============================
 
-def member_menu():
+def member_menu(session):
     """Displays limited actions available to library members."""
     while True:
-        print("\n=== MEMBER MENU ===")
-        print("1. View All Books")
-        print("2. Borrow Book")
-        print("3. Return Book")
-        print("0. Logout")
+        profile_action_done()
+        if not session_active(session):
+            break
+        show_menu("MEMBER MENU", MEMBER_MENU)
 
         choice = input("Enter your choice: ").strip()
+        profile_action(MEMBER_MENU, choice)
+        if choice in MEMBER_CHOICES and not check_access(session, MEMBER_CHOICES[choice]):
+            continue
 
         if choice == "1":
             pretty_print_books()
@@ -227,7 +343,7 @@ def member_menu():
             else:
                 print("Return failed. Please verify details.")
         elif choice == "0":
-            security.logout()
+            security.logout(session)
             break
         else:
             print("Invalid choice. Try again.")
@@ -237,21 +353,45 @@ def member_menu():
 # MAIN PROGRAM ENTRY
 # ==============================
 
-def main():
-    """Main entry point for the system."""
+def main(profile=None):
+    """
+    Main entry point for the system. If profile is True, or not given and
+    --profile or READEASY_PROFILE=1 is used, the session is profiled and a
+    report is written to logs/profiles on logout.
+    """
+    global profiler
+    if profile is None:
+        profile = "--profile" in sys.argv[1:] or os.environ.get(PROFILE_ENV, "0") != "0"
+
     print("=====================================")
     print(" Welcome to ReadEasy Library System ")
     print("=====================================")
 
-    if not security.authenticate():
+    # Write audit records from a background thread so the menus never wait on the disk
+    security.set_log_mode("async")
+
+    # Load the saved library, or save the preloaded samples on the first run
+    operations.use_storage(storage.SQLiteStorage(storage.DATABASE_FILE))
+
+    session = security.authenticate()
+    if session is None:
         return
 
-    if security.current_user["role"] == "admin":
-        admin_menu()
-    elif security.current_user["role"] == "staff":
-        staff_menu()
-    elif security.current_user["role"] == "member":
-        member_menu()
+    if profile:
+        profiler = profiling.SessionProfiler()
+        profiler.start()
+    try:
+        if session.role == "admin":
+            admin_menu(session)
+        elif session.role == "staff":
+            staff_menu(session)
+        elif session.role == "member":
+            member_menu(session)
+    finally:
+        if profiler is not None:
+            path = profiler.write_report(session.username)
+            profiler = None
+            print(f"Profile report written to {path}")
 
     print("\nThank you for using the ReadEasy Mini Library Management System.")
 
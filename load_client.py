@@ -0,0 +1,161 @@
+# ================================================
+# ReadEasy Mini Library Management System
+#
+# PROG211 - Individual Assignment
+# Student: Joshua Mohamed Katibi Yaffa
+# ID: 905004075
+# Class: BSEM1101
+# Semester: 3
+# Year: 2
+#
+# Load Generator - Many Desks Against the Server
+#
+# GitHub: JoshuaYaffa/SmartLibrary-Group-I
+# ================================================
+
+"""
+This file pretends to be many desks using server.py at the same time and
+reports how many requests per second were served and how long they took.
+Each desk logs in as staff and then repeats a mix of searches, borrows,
+returns and summaries.
+
+Run against a running server:
+    python load_client.py [host] [port]
+Or with no running server, start one inside this process first:
+    python load_client.py --local
+
+A real server limits how often one address may log in, so a run with
+many desks against it needs a higher security.LOGIN_SOURCE_BURST setting
+there. --local raises it itself.
+"""
+
+import asyncio
+import json
+import sys
+import time
+import security
+import server
+
+SEARCH_WORDS = ["harry", "potter", "odyssey", "dune", "classic", "fantasy", "the", "gatsby"]
+SAMPLE_ISBNS = [str(n) for n in range(91, 101)]
+
+
+# ==============================
+# Load Generator
+# ==============================
+
+class Desk:
+    """One client connection that sends requests and waits for each reply."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+
+    async def call(self, action, **fields):
+        """Sends one request and returns the reply."""
+        self.next_id += 1
+        request = dict(fields, id=self.next_id, action=action)
+        self.writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+
+def desk_requests(number, count):
+    """Returns the (action, fields) pairs one desk will send."""
+    requests = []
+    member_id = f"M{number % 10 + 1:03d}"
+    for n in range(count):
+        isbn = SAMPLE_ISBNS[(number + n) % len(SAMPLE_ISBNS)]
+        kind = n % 4
+        if kind == 0:
+            requests.append(("search", {"keyword": SEARCH_WORDS[(number + n) % len(SEARCH_WORDS)]}))
+        elif kind == 1:
+            requests.append(("borrow", {"isbn": isbn, "member_id": member_id}))
+        elif kind == 2:
+            requests.append(("return", {"isbn": SAMPLE_ISBNS[(number + n - 1) % len(SAMPLE_ISBNS)],
+                                        "member_id": member_id}))
+        else:
+            requests.append(("summary", {}))
+    return requests
+
+
+async def run_desk(host, port, number, count, latencies):
+    """Logs one desk in and sends its requests, recording each latency."""
+    reader, writer = await asyncio.open_connection(host, port)
+    desk = Desk(reader, writer)
+    reply = await desk.call("login", username="staff", password="staff123", role="staff")
+    if not reply["ok"]:
+        raise RuntimeError(f"login failed: {reply['error']}")
+    for action, fields in desk_requests(number, count):
+        start = time.perf_counter()
+        await desk.call(action, **fields)
+        latencies.append(time.perf_counter() - start)
+    await desk.call("logout")
+    writer.close()
+    await writer.wait_closed()
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value below which the given fraction of values fall."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def run_load(host=server.SERVER_HOST, port=server.SERVER_PORT, desks=50, requests_per_desk=200):
+    """
+    Runs desks clients at once, each sending requests_per_desk requests.
+    Returns {"requests", "seconds", "requests_per_sec", "p50_ms", "p99_ms"}.
+    """
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_desk(host, port, number, requests_per_desk, latencies)
+                           for number in range(desks)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run_local_load(desks=50, requests_per_desk=200):
+    """
+    Starts a server on a free port in this process and runs the load
+    against it, letting every desk log in from the one local address.
+    """
+    limiter = security.source_limiter
+    security.source_limiter = security.RateLimiter(desks, security.LOGIN_SOURCE_REFILL)
+    try:
+        local = await server.start_server(port=0)
+        port = local.sockets[0].getsockname()[1]
+        async with local:
+            return await run_load(server.SERVER_HOST, port, desks, requests_per_desk)
+    finally:
+        security.source_limiter = limiter
+
+
+def print_results(results, desks):
+    """Prints the results of run_load."""
+    print(f"\n=== Server Load ({desks} desks, {results['requests']} requests) ===")
+    print("{:<30} {:>10.0f} requests/sec".format("Throughput:", results["requests_per_sec"]))
+    print("{:<30} {:>10.2f} ms".format("Median latency:", results["p50_ms"]))
+    print("{:<30} {:>10.2f} ms".format("p99 latency:", results["p99_ms"]))
+
+
+# ==============================
+# MAIN PROGRAM ENTRY
+# ==============================
+
+if __name__ == "__main__":
+    desk_count = 50
+    if sys.argv[1:] == ["--local"]:
+        results = asyncio.run(run_local_load(desk_count))
+    else:
+        host = sys.argv[1] if len(sys.argv) > 1 else server.SERVER_HOST
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else server.SERVER_PORT
+        results = asyncio.run(run_load(host, port, desk_count))
+    print_results(results, desk_count)
@@ -0,0 +1,214 @@
+# ================================================
+# ReadEasy Mini Library Management System
+#
+# PROG211 - Individual Assignment
+# Student: Joshua Mohamed Katibi Yaffa
+# ID: 905004075
+# Class: BSEM1101
+# Semester: 3
+# Year: 2
+#
+# Metrics Module - Timing the Busiest Functions
+#
+# GitHub: JoshuaYaffa/SmartLibrary-Group-I
+# ================================================
+
+"""
+This module counts how often the busiest functions run, how long they
+take and how often they fail, while the system is in use.
+
+    @metrics.timed("operations.borrow_book")
+    def borrow_book(...): ...
+
+    with metrics.timer("storage.save"):
+        ...
+
+Timings go into a histogram with fixed buckets, so recording one costs
+the same no matter how long the program has been running. Call disable()
+to switch recording off; a timed function then only pays for one extra
+check. Setting the environment variable READEASY_METRICS=0 before
+starting switches it off completely: functions are then not wrapped at
+all. The admin menu can show the results as text or JSON.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# Recording is switched on and off for the whole program
+ENABLED = os.environ.get("READEASY_METRICS", "1") != "0"
+_WRAP = ENABLED   # Fixed at start-up: if False, timed() leaves functions alone
+
+# Bucket k of a histogram counts calls that took from 2**(k-1) up to
+# 2**k nanoseconds, so finding the bucket is a single bit_length().
+BUCKETS = 64
+
+
+# ==============================
+# Metric Records
+# ==============================
+
+class Metric:
+    """Call count, error count and latency histogram of one timed function or block."""
+
+    __slots__ = ("name", "calls", "errors", "total", "slowest", "buckets")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total = 0          # Nanoseconds
+        self.slowest = 0
+        self.buckets = [0] * BUCKETS
+
+    def record(self, nanoseconds, failed=False):
+        """Adds one call that took the given number of nanoseconds."""
+        # No lock: taking one would double the cost of recording. The updates
+        # below make no Python calls, so CPython does not switch threads in
+        # the middle of them and no count is lost in practice.
+        self.calls += 1
+        self.total += nanoseconds
+        self.buckets[nanoseconds.bit_length()] += 1
+        if nanoseconds > self.slowest:
+            self.slowest = nanoseconds
+        if failed:
+            self.errors += 1
+
+    def percentile(self, fraction):
+        """Returns the time (in microseconds) within which fraction of calls finished."""
+        wanted = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted:
+                # The top of the bucket, but never more than the slowest call
+                return min(2 ** bucket, self.slowest) / 1000
+        return self.slowest / 1000
+
+    def summary(self):
+        """Returns the metric as a dictionary of plain values, times in microseconds."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "mean_us": self.total / self.calls / 1000 if self.calls else 0.0,
+            "p50_us": self.percentile(0.50) if self.calls else 0.0,
+            "p99_us": self.percentile(0.99) if self.calls else 0.0,
+            "max_us": self.slowest / 1000,
+            "histogram": {f"<={2 ** bucket / 1000:g}us": count
+                          for bucket, count in enumerate(self.buckets) if count},
+        }
+
+
+registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_metric(name):
+    """Returns the metric with this name, creating it on first use."""
+    metric = registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = registry.setdefault(name, Metric(name))
+    return metric
+
+
+# ==============================
+# Recording
+# ==============================
+
+def timed(name):
+    """Decorator that records every call of a function under the given name."""
+    def decorate(func):
+        if not _WRAP:
+            return func
+        metric = get_metric(name)
+        clock = time.perf_counter_ns
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                metric.record(clock() - start, failed=True)
+                raise
+            # Metric.record written out here, as this runs on every call
+            elapsed = clock() - start
+            metric.calls += 1
+            metric.total += elapsed
+            metric.buckets[elapsed.bit_length()] += 1
+            if elapsed > metric.slowest:
+                metric.slowest = elapsed
+            return result
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def timer(name):
+    """Context manager that records how long its block takes under the given name."""
+    if not ENABLED:
+        yield
+        return
+    metric = get_metric(name)
+    start = time.perf_counter_ns()
+    try:
+        yield
+    except BaseException:
+        metric.record(time.perf_counter_ns() - start, failed=True)
+        raise
+    metric.record(time.perf_counter_ns() - start)
+
+
+def enable():
+    """Switches recording on."""
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    """Switches recording off. Timed functions then cost one extra check and call."""
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Clears every recorded value but keeps the metrics themselves."""
+    for metric in list(registry.values()):
+        metric.calls = metric.errors = 0
+        metric.total = metric.slowest = 0
+        metric.buckets = [0] * BUCKETS
+
+
+# ==============================
+# Reports
+# ==============================
+
+def snapshot():
+    """Returns every metric that has been used, as {name: summary}."""
+    return {name: metric.summary() for name, metric in sorted(registry.items()) if metric.calls}
+
+
+def report_json():
+    """Returns the metrics as a JSON document."""
+    return json.dumps({"enabled": ENABLED, "metrics": snapshot()}, indent=2)
+
+
+def report_text():
+    """Returns the metrics as a table for printing."""
+    lines = ["{:<32} {:>9} {:>7} {:>10} {:>10} {:>10}".format(
+        "Metric", "Calls", "Errors", "Mean us", "p99 us", "Max us")]
+    for name, values in snapshot().items():
+        lines.append("{:<32} {:>9} {:>7} {:>10.1f} {:>10.0f} {:>10.0f}".format(
+            name, values["calls"], values["errors"], values["mean_us"],
+            values["p99_us"], values["max_us"]))
+    if len(lines) == 1:
+        lines.append("No calls recorded yet.")
+    if not ENABLED:
+        lines.append("(Recording is switched off.)")
+    return "\n".join(lines)
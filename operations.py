@@ -19,68 +19,685 @@ deleting, and searching for books and members. It also manages the borrowing
 and returning of books, along with a summary of system activity.
 """
 
+import collections
+import contextlib
+import csv
+import itertools
+import json
+import re
+import threading
+import time
+import metrics
+import security
+import storage
+
 # ==============================
 # Data Structures
 # ==============================
 
 books = {}      # Stores book details (ISBN -> book info)
 members = {}    # Stores member details (ID -> member info)
+search_index = {}   # Stores search terms (word prefix -> {ISBN: field weight})
+fuzzy_words = {}    # Title and author words for fuzzy search (word -> number of books)
+trigram_index = {}  # Three-letter pieces of those words (trigram -> set of words)
+borrowers = {}  # Stores who has each book out (ISBN -> set of member IDs)
+
+# Running totals kept up to date by every function that changes the data,
+# so the summary never has to walk through all books and members.
+stats = {
+    "total_titles": 0,
+    "total_copies": 0,
+    "available_copies": 0,
+    "active_loans": 0,
+    "genres": {},   # Genre -> number of titles
+}
+
+# Where changes are saved. See storage.py and use_storage().
+store = storage.MemoryStorage()
+
+
+# ==============================
+# Locks for Multi-Threaded Use
+# ==============================
+
+# Borrowing and returning only lock the book involved. Books are spread
+# over a fixed set of "stripe" locks by ISBN, so desks working on different
+# books rarely wait for each other. Adding, changing or removing books and
+# members also takes the catalog lock. Locks are always taken in the order
+# catalog lock, then stripes in ascending order, then the storage backend.
+LOCK_STRIPES = 64
+_catalog_lock = threading.RLock()
+_stripe_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+# Changes to [available copies, active loans] made by borrowing and
+# returning, kept per stripe so they can be updated under the stripe lock.
+# summary() adds them to the totals in stats.
+_loan_changes = [[0, 0] for _ in range(LOCK_STRIPES)]
+
+
+def _stripe(isbn):
+    """Returns the number of the stripe lock that guards a book."""
+    return hash(isbn) % LOCK_STRIPES
+
+
+@contextlib.contextmanager
+def _locked_stripes(stripes):
+    """Holds the given stripe locks, taking them in ascending order."""
+    ordered = sorted(set(stripes))
+    for number in ordered:
+        _stripe_locks[number].acquire()
+    try:
+        yield
+    finally:
+        for number in reversed(ordered):
+            _stripe_locks[number].release()
+
+
+def _locked_books(*isbns):
+    """Holds the stripe locks of the given books."""
+    return _locked_stripes(_stripe(isbn) for isbn in isbns)
+
+
+def _locked_everything():
+    """Holds every stripe lock, for changes that can touch any book."""
+    return _locked_stripes(range(LOCK_STRIPES))
+
+
+def _checkpoint():
+    """Lets the storage backend compact its data while nothing is changing."""
+    if store.checkpoint_due():
+        with _catalog_lock, _locked_everything():
+            if store.checkpoint_due():
+                store.checkpoint()
+
+
+# ==============================
+# Record Types
+# ==============================
+
+class Record:
+    """
+    Base class for compact records stored with __slots__ instead of a dict.
+    Fields can be read and written as attributes (book.title) or, as in
+    earlier versions of the system, by key (book["title"]).
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def keys(self):
+        """Returns the field names of the record."""
+        return self.__slots__
+
+    def as_dict(self):
+        """Returns the record as a plain dictionary."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()})"
+
+
+class Book(Record):
+    """A book in the catalog."""
+
+    __slots__ = ("title", "author", "genre", "total_copies", "available_copies")
+
+    def __init__(self, title, author, genre, total_copies, available_copies=None):
+        self.title = title
+        self.author = author
+        self.genre = genre
+        self.total_copies = total_copies
+        self.available_copies = total_copies if available_copies is None else available_copies
+
+
+class Member(Record):
+    """A registered library member and the books they have borrowed."""
+
+    __slots__ = ("name", "email", "borrowed_books")
+
+    def __init__(self, name, email, borrowed_books=()):
+        self.name = name
+        self.email = email
+        self.borrowed_books = LoanSet(borrowed_books)
+
+
+# ==============================
+# Loan Records
+# ==============================
+
+class LoanSet:
+    """
+    Keeps the ISBNs a member has borrowed in the order they were borrowed.
+    Adding, removing and checking a loan take constant time, no matter
+    how many books the member holds.
+    """
+
+    __slots__ = ("_loans",)
+
+    def __init__(self, isbns=()):
+        self._loans = dict.fromkeys(isbns)
+
+    def add(self, isbn):
+        """Records a new loan."""
+        self._loans[isbn] = None
+
+    def remove(self, isbn):
+        """Removes a loan, raising KeyError if it does not exist."""
+        del self._loans[isbn]
+
+    def discard(self, isbn):
+        """Removes a loan if it exists."""
+        self._loans.pop(isbn, None)
+
+    # Kept so older code that treated loans as a list keeps working
+    append = add
+
+    def __contains__(self, isbn):
+        return isbn in self._loans
+
+    def __iter__(self):
+        return iter(self._loans)
+
+    def __len__(self):
+        return len(self._loans)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"LoanSet({list(self._loans)})"
+
+
+# ==============================
+# Search Index Helpers
+# ==============================
+
+# A match in the title ranks above a match in the author, which in turn
+# ranks above a match in the genre.
+FIELD_WEIGHTS = {"title": 3, "author": 2, "genre": 1}
+
+# Letters and digits of any script, so "Война" is a word like "War"
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _tokenize(text):
+    """Splits text into case-folded words, ignoring punctuation."""
+    return _WORD_PATTERN.findall(text.casefold())
+
+
+def _book_terms(book):
+    """Returns every word prefix of a book mapped to its best field weight."""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for word in _tokenize(getattr(book, field)):
+            for end in range(1, len(word) + 1):
+                prefix = word[:end]
+                if terms.get(prefix, 0) < weight:
+                    terms[prefix] = weight
+    return terms
+
+
+def _index_book(isbn, book):
+    """Adds a book's search terms to the search index."""
+    for term, weight in _book_terms(book).items():
+        search_index.setdefault(term, {})[isbn] = weight
+    for word in _fuzzy_book_words(book):
+        _add_fuzzy_word(word, 1)
+
+
+def _index_books(isbns):
+    """
+    Adds many new books to the search index at once. Books that share a
+    word share the work: each distinct word's prefixes are worked out once
+    and all of its books are added to them together.
+    """
+    # First group the books by the exact text of each field; authors and
+    # genres repeat a lot, so each distinct text is only split into words once.
+    texts = {weight: {} for weight in FIELD_WEIGHTS.values()}
+    fields = list(FIELD_WEIGHTS.items())
+    for isbn in isbns:
+        book = books[isbn]
+        for field, weight in fields:
+            texts[weight].setdefault(getattr(book, field), []).append(isbn)
+
+    # weight -> word -> ISBNs of the new books with that word in that field
+    groups = {weight: {} for weight in FIELD_WEIGHTS.values()}
+    for weight, text_isbns in texts.items():
+        group = groups[weight]
+        for text, text_isbn_list in text_isbns.items():
+            for word in set(_tokenize(text)):
+                group.setdefault(word, []).extend(text_isbn_list)
+
+    # Each title or author word counts once per book for fuzzy search
+    fuzzy_isbns = {}
+    for field in ("title", "author"):
+        for word, word_isbns in groups[FIELD_WEIGHTS[field]].items():
+            fuzzy_isbns.setdefault(word, set()).update(word_isbns)
+    for word, word_isbns in fuzzy_isbns.items():
+        _add_fuzzy_word(word, len(word_isbns))
+
+    # Lower weights first, so a book found in several fields keeps its best one
+    for weight in sorted(groups):
+        for word, word_isbns in groups[weight].items():
+            postings = dict.fromkeys(word_isbns, weight)
+            for end in range(1, len(word) + 1):
+                prefix = word[:end]
+                if prefix in search_index:
+                    search_index[prefix].update(postings)
+                else:
+                    search_index[prefix] = dict(postings)
+
+
+def _unindex_book(isbn, book):
+    """Removes a book's search terms from the search index."""
+    for term in _book_terms(book):
+        postings = search_index.get(term)
+        if postings is None:
+            continue
+        postings.pop(isbn, None)
+        if not postings:
+            del search_index[term]
+    for word in _fuzzy_book_words(book):
+        _remove_fuzzy_word(word)
+
+
+# ==============================
+# Fuzzy Search Helpers
+# ==============================
+
+# Typos are forgiven by edit distance: the number of letters that must be
+# added, removed or changed to turn one word into another. Short words get
+# fewer edits, or "cat" would match half the catalog.
+FUZZY_MAX_EDITS = 2
+
+
+def _allowed_edits(word):
+    """Returns how many typos are forgiven in a search word of this length."""
+    if len(word) < 3:
+        return 0
+    if len(word) < 7:
+        return 1
+    return FUZZY_MAX_EDITS
+
+
+def _trigrams(word):
+    """Returns the set of three-letter pieces of a word, padded at both ends."""
+    padded = f"$${word}$$"
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def _fuzzy_book_words(book):
+    """Returns the distinct words of a book's title and author."""
+    return set(_tokenize(book.title)) | set(_tokenize(book.author))
+
+
+def _add_fuzzy_word(word, count):
+    """Counts count more books using a word, indexing its trigrams if it is new."""
+    if word in fuzzy_words:
+        fuzzy_words[word] += count
+        return
+    fuzzy_words[word] = count
+    for gram in _trigrams(word):
+        trigram_index.setdefault(gram, set()).add(word)
+
+
+def _remove_fuzzy_word(word):
+    """Counts one book fewer using a word, dropping it when no book uses it."""
+    count = fuzzy_words.get(word, 0) - 1
+    if count > 0:
+        fuzzy_words[word] = count
+        return
+    fuzzy_words.pop(word, None)
+    for gram in _trigrams(word):
+        words = trigram_index.get(gram)
+        if words is not None:
+            words.discard(word)
+            if not words:
+                del trigram_index[gram]
+
+
+def _edit_distance(first, second, limit):
+    """Returns the edit distance between two words, or limit + 1 if it is larger."""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = list(range(len(second) + 1))
+    for row, first_char in enumerate(first, 1):
+        current = [row]
+        for column, second_char in enumerate(second, 1):
+            current.append(min(previous[column] + 1, current[column - 1] + 1,
+                               previous[column - 1] + (first_char != second_char)))
+        # Every later row is at least this row's smallest value
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def _similar_words(word):
+    """
+    Returns {title or author word: edit distance} for the words within the
+    allowed number of edits of word. Each edit changes at most three of a
+    word's trigrams, so within k edits two words share all but 3k of the
+    distinct trigrams of either one. Only words sharing that many trigrams
+    with it are checked; the rest of the vocabulary is never looked at.
+    """
+    limit = _allowed_edits(word)
+    if limit == 0:
+        return {}
+    grams = _trigrams(word)
+    shared = {}
+    for gram in grams:
+        # Copied, as searching takes no locks and the set may change meanwhile
+        for candidate in tuple(trigram_index.get(gram, ())):
+            shared[candidate] = shared.get(candidate, 0) + 1
+
+    similar = {}
+    needed = len(grams) - 3 * limit
+    for candidate, count in shared.items():
+        if count >= needed and count >= len(_trigrams(candidate)) - 3 * limit:
+            distance = _edit_distance(word, candidate, limit)
+            if distance <= limit:
+                similar[candidate] = distance
+    return similar
+
+
+def _fuzzy_matches(word):
+    """
+    Returns {ISBN: score} for the books matching one search word, exactly
+    (as a word prefix) or within the allowed number of typos. A typo match
+    scores less than an exact match in the same field.
+    """
+    scores = dict(search_index.get(word, {}))
+    for similar, distance in _similar_words(word).items():
+        for book_id, weight in dict(search_index.get(similar, {})).items():
+            score = weight / (1 + distance)
+            if score > scores.get(book_id, 0):
+                scores[book_id] = score
+    return scores
+
+
+# ==============================
+# Search Result Cache
+# ==============================
+
+# Desks search for the same few keywords over and over, so recent results
+# are kept as lists of ISBNs, keyed by the query's words. Entries are
+# dropped when they are least recently used, when they grow old, and when
+# a book that matched them (before or after the change) is added, changed
+# or deleted. Borrowing and returning do not change results.
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_SECONDS = 5 * 60
+
+_search_cache = collections.OrderedDict()   # query words -> (expiry time, [isbn, ...])
+_search_cache_words = {}                    # word -> cached queries using it
+_search_cache_lock = threading.Lock()
+# Raised by every invalidation, so a search that ran while the catalog
+# changed does not store a result that may already be out of date.
+_search_cache_version = 0
+_search_cache_counts = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _cached_search(query):
+    """Returns (cached ISBNs or None, cache version to pass to _cache_search)."""
+    with _search_cache_lock:
+        entry = _search_cache.get(query)
+        if entry is not None:
+            if entry[0] >= time.monotonic():
+                _search_cache.move_to_end(query)
+                _search_cache_counts["hits"] += 1
+                return entry[1], _search_cache_version
+            _drop_cached_search(query)
+        _search_cache_counts["misses"] += 1
+        return None, _search_cache_version
+
+
+def _cache_search(query, isbns, version):
+    """Stores a search result unless the catalog changed since version."""
+    with _search_cache_lock:
+        if version != _search_cache_version:
+            return
+        if query in _search_cache:
+            _drop_cached_search(query)
+        _search_cache[query] = (time.monotonic() + SEARCH_CACHE_SECONDS, isbns)
+        for word in query:
+            _search_cache_words.setdefault(word, set()).add(query)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _drop_cached_search(next(iter(_search_cache)))
+            _search_cache_counts["evictions"] += 1
+
+
+def _drop_cached_search(query):
+    """Removes one cached search. Needs _search_cache_lock."""
+    del _search_cache[query]
+    for word in query:
+        queries = _search_cache_words[word]
+        queries.discard(query)
+        if not queries:
+            del _search_cache_words[word]
+
+
+# The searched fields of a book as they were before a change
+SearchFields = collections.namedtuple("SearchFields", list(FIELD_WEIGHTS))
+
+
+def _invalidate_searches(*changed):
+    """
+    Drops the cached searches a changed book matches, given the book (or
+    its SearchFields) before and/or after the change. A query matches a
+    book when every one of its words is one of the book's word prefixes.
+    Call it after the search index has been changed, whether or not
+    anything is cached, so searches that overlapped the change are not
+    stored.
+    """
+    global _search_cache_version
+    with _search_cache_lock:
+        _search_cache_version += 1
+        if not _search_cache:
+            return
+        affected = set()
+        for terms in map(_book_terms, changed):
+            for term in terms:
+                for query in _search_cache_words.get(term, ()):
+                    if all(word in terms for word in query):
+                        affected.add(query)
+        for query in affected:
+            _drop_cached_search(query)
+        _search_cache_counts["invalidations"] += len(affected)
+
+
+def clear_search_cache():
+    """Empties the search cache, for changes that touch many books at once."""
+    global _search_cache_version
+    with _search_cache_lock:
+        _search_cache_version += 1
+        _search_cache_counts["invalidations"] += len(_search_cache)
+        _search_cache.clear()
+        _search_cache_words.clear()
+
+
+def search_cache_stats():
+    """Returns the search cache's hits, misses, evictions, invalidations, size and hit rate."""
+    with _search_cache_lock:
+        stats_copy = dict(_search_cache_counts, size=len(_search_cache))
+    lookups = stats_copy["hits"] + stats_copy["misses"]
+    stats_copy["hit_rate"] = stats_copy["hits"] / lookups if lookups else 0.0
+    return stats_copy
+
+
+# ==============================
+# Running Totals Helpers
+# ==============================
+
+def _count_book(book, sign):
+    """Adds (sign=1) or removes (sign=-1) a book from the running totals."""
+    stats["total_titles"] += sign
+    stats["total_copies"] += sign * book.total_copies
+    stats["available_copies"] += sign * book.available_copies
+    genres = stats["genres"]
+    genres[book.genre] = genres.get(book.genre, 0) + sign
+    if not genres[book.genre]:
+        del genres[book.genre]
 
 
 # ==============================
 # Book Management Functions
 # ==============================
 
+@metrics.timed("operations.add_book")
 def add_book(isbn, title, author, genre, total_copies):
     """Adds a new book record into the system."""
-    if isbn in books:
-        return False
-    books[isbn] = {
-        "title": title,
-        "author": author,
-        "genre": genre,
-        "total_copies": total_copies,
-        "available_copies": total_copies
-    }
+    with _catalog_lock, _locked_books(isbn):
+        if isbn in books:
+            return False
+        book = Book(title, author, genre, total_copies)
+        # Saved and counted before anyone can see it, so a loan of the new
+        # book can never be saved or counted ahead of the book itself
+        store.add_book(isbn, book)
+        _count_book(book, 1)
+        _index_book(isbn, book)
+        books[isbn] = book
+        _invalidate_searches(book)
+    _checkpoint()
     return True
 
 
-def search_books(keyword):
-    """Searches for books by title, author, or genre."""
-    results = []
-    for book_id, book in books.items():
-        if (keyword.lower() in book["title"].lower() or
-            keyword.lower() in book["author"].lower() or
-            keyword.lower() in book["genre"].lower()):
-            results.append((book_id, book))
-    return results
+@metrics.timed("operations.search_books")
+def search_books(keyword, fuzzy=False):
+    """
+    Searches for books by title, author, or genre.
+    Every word of the keyword must start a word in one of the fields.
+    Results are ranked so that title matches come before author matches,
+    and author matches come before genre matches.
+    With fuzzy=True a word may also be a misspelling of a title or author
+    word ("gatsbi", "rowlng"); exact matches still rank first. Fuzzy
+    searches are not cached.
+    """
+    if not keyword.strip():
+        return list(books.items())
+    words = _tokenize(keyword)
+    if not words:
+        # Only punctuation, which no book can match
+        return []
+    if fuzzy:
+        return _fuzzy_search(set(words))
+
+    query = tuple(sorted(set(words)))
+    isbns, version = _cached_search(query)
+    if isbns is not None:
+        found = [(book_id, books.get(book_id)) for book_id in isbns]
+        return [(book_id, book) for book_id, book in found if book is not None]
+
+    # Start from the rarest word so the candidate set stays small
+    postings = []
+    for word in query:
+        matches = search_index.get(word)
+        if not matches:
+            _cache_search(query, [], version)
+            return []
+        postings.append(matches)
+    postings.sort(key=len)
+
+    scores = dict(postings[0])
+    for matches in postings[1:]:
+        scores = {
+            book_id: score + matches[book_id]
+            for book_id, score in scores.items()
+            if book_id in matches
+        }
+
+    # Searching takes no locks, so skip any book deleted in the meantime
+    found = [(book_id, books.get(book_id)) for book_id in scores]
+    found = [(book_id, book) for book_id, book in found if book is not None]
+    found.sort(key=lambda item: (-scores[item[0]], item[1].title))
+    _cache_search(query, [book_id for book_id, _ in found], version)
+    return found
+
+
+def _fuzzy_search(words):
+    """Does the work of search_books for fuzzy=True."""
+    postings = []
+    for word in words:
+        matches = _fuzzy_matches(word)
+        if not matches:
+            return []
+        postings.append(matches)
+    postings.sort(key=len)
+
+    scores = postings[0]
+    for matches in postings[1:]:
+        scores = {
+            book_id: score + matches[book_id]
+            for book_id, score in scores.items()
+            if book_id in matches
+        }
+
+    found = [(book_id, books.get(book_id)) for book_id in scores]
+    found = [(book_id, book) for book_id, book in found if book is not None]
+    found.sort(key=lambda item: (-scores[item[0]], item[1].title))
+    return found
 
 
 def update_book(isbn, title=None, author=None, genre=None, total_copies=None):
     """Updates existing book details."""
-    if isbn not in books:
-        return False
-    if title:
-        books[isbn]["title"] = title
-    if author:
-        books[isbn]["author"] = author
-    if genre:
-        books[isbn]["genre"] = genre
-    if total_copies is not None:
-        difference = total_copies - books[isbn]["total_copies"]
-        books[isbn]["total_copies"] = total_copies
-        books[isbn]["available_copies"] += difference
-        if books[isbn]["available_copies"] < 0:
-            books[isbn]["available_copies"] = 0
+    with _catalog_lock, _locked_books(isbn):
+        if isbn not in books:
+            return False
+        book = books[isbn]
+        old_fields = SearchFields(book.title, book.author, book.genre)
+        _unindex_book(isbn, book)
+        _count_book(book, -1)
+        if title:
+            book.title = title
+        if author:
+            book.author = author
+        if genre:
+            book.genre = genre
+        if total_copies is not None:
+            difference = total_copies - book.total_copies
+            book.total_copies = total_copies
+            book.available_copies += difference
+            if book.available_copies < 0:
+                book.available_copies = 0
+        _index_book(isbn, book)
+        _count_book(book, 1)
+        # Only the searched fields change results, not the number of copies
+        if old_fields != (book.title, book.author, book.genre):
+            _invalidate_searches(old_fields, book)
+        store.update_book(isbn, book)
+    _checkpoint()
     return True
 
 
 def delete_book(isbn):
     """Deletes a book record from the system."""
-    if isbn in books:
-        del books[isbn]
-        return True
-    return False
+    with _catalog_lock, _locked_books(isbn):
+        if isbn not in books:
+            return False
+        # Clear the book from the loan lists of anyone still holding it
+        holders = borrowers.pop(isbn, ())
+        for member_id in holders:
+            members[member_id].borrowed_books.discard(isbn)
+        stats["active_loans"] -= len(holders)
+        _unindex_book(isbn, books[isbn])
+        _count_book(books[isbn], -1)
+        _invalidate_searches(books.pop(isbn))
+        store.delete_book(isbn)
+    _checkpoint()
+    return True
 
 
 def pretty_print_books():
@@ -95,7 +712,7 @@ def pretty_print_books():
     print("-" * 105)
     for book_id, info in books.items():
         print("{:<15} {:<35} {:<25} {:<15} {:<10}".format(
-            book_id, info["title"], info["author"], info["genre"], info["available_copies"]
+            book_id, info.title, info.author, info.genre, info.available_copies
         ))
 
 
@@ -105,29 +722,46 @@ def pretty_print_books():
 
 def add_member(member_id, name, email):
     """Adds a new library member."""
-    if member_id in members:
-        return False
-    members[member_id] = {"name": name, "email": email, "borrowed_books": []}
+    with _catalog_lock:
+        if member_id in members:
+            return False
+        members[member_id] = Member(name, email)
+        store.add_member(member_id, members[member_id])
+    _checkpoint()
     return True
 
 
 def update_member(member_id, name=None, email=None):
     """Updates member information."""
-    if member_id not in members:
-        return False
-    if name:
-        members[member_id]["name"] = name
-    if email:
-        members[member_id]["email"] = email
+    with _catalog_lock:
+        if member_id not in members:
+            return False
+        if name:
+            members[member_id].name = name
+        if email:
+            members[member_id].email = email
+        store.update_member(member_id, members[member_id])
+    _checkpoint()
     return True
 
 
 def delete_member(member_id):
     """Deletes a member from the system."""
-    if member_id in members:
+    # The member may hold any book, so no loans can change meanwhile
+    with _catalog_lock, _locked_everything():
+        if member_id not in members:
+            return False
+        # Put the member's outstanding loans back on the shelf
+        loans = members[member_id].borrowed_books
+        for isbn in loans:
+            _remove_borrower(isbn, member_id)
+            books[isbn].available_copies += 1
+        stats["available_copies"] += len(loans)
+        stats["active_loans"] -= len(loans)
         del members[member_id]
-        return True
-    return False
+        store.delete_member(member_id)
+    _checkpoint()
+    return True
 
 
 def pretty_print_members():
@@ -141,9 +775,9 @@ def pretty_print_members():
     ))
     print("-" * 100)
     for member_id, info in members.items():
-        borrowed = len(info["borrowed_books"])
+        borrowed = len(info.borrowed_books)
         print("{:<10} {:<30} {:<35} {:<15}".format(
-            member_id, info["name"], info["email"], borrowed
+            member_id, info.name, info.email, borrowed
         ))
 
 
@@ -151,48 +785,482 @@ def pretty_print_members():
 # Borrow and Return Functions
 # ==============================
 
+def _remove_borrower(isbn, member_id):
+    """Removes a member from the borrowers index of a book."""
+    holders = borrowers.get(isbn)
+    if holders is None:
+        return
+    holders.discard(member_id)
+    if not holders:
+        del borrowers[isbn]
+
+
+def get_borrowers(isbn):
+    """Returns the IDs of all members who currently have a book out."""
+    return sorted(borrowers.get(isbn, ()))
+
+
+# Result codes for circulation requests
+OK = "ok"
+NO_SUCH_BOOK = "no_such_book"
+NO_SUCH_MEMBER = "no_such_member"
+NO_COPIES_LEFT = "no_copies_left"
+ALREADY_BORROWED = "already_borrowed"
+NOT_BORROWED = "not_borrowed"
+NOT_APPLIED = "not_applied"   # Valid, but the all-or-nothing batch was cancelled
+
+
+def _borrow_result(isbn, member_id):
+    """Returns the result code a borrow request would get right now."""
+    book = books.get(isbn)
+    if book is None:
+        return NO_SUCH_BOOK
+    member = members.get(member_id)
+    if member is None:
+        return NO_SUCH_MEMBER
+    if isbn in member.borrowed_books:
+        return ALREADY_BORROWED
+    if book.available_copies <= 0:
+        return NO_COPIES_LEFT
+    return OK
+
+
+def _return_result(isbn, member_id):
+    """Returns the result code a return request would get right now."""
+    if isbn not in books:
+        return NO_SUCH_BOOK
+    member = members.get(member_id)
+    if member is None:
+        return NO_SUCH_MEMBER
+    if isbn not in member.borrowed_books:
+        return NOT_BORROWED
+    return OK
+
+
+def _apply_borrow(isbn, member_id):
+    """Records a loan that has already been checked. Needs the book's stripe lock."""
+    books[isbn].available_copies -= 1
+    members[member_id].borrowed_books.add(isbn)
+    borrowers.setdefault(isbn, set()).add(member_id)
+    changes = _loan_changes[_stripe(isbn)]
+    changes[0] -= 1
+    changes[1] += 1
+
+
+def _apply_return(isbn, member_id):
+    """Removes a loan that has already been checked. Needs the book's stripe lock."""
+    books[isbn].available_copies += 1
+    members[member_id].borrowed_books.discard(isbn)
+    _remove_borrower(isbn, member_id)
+    changes = _loan_changes[_stripe(isbn)]
+    changes[0] += 1
+    changes[1] -= 1
+
+
+@metrics.timed("operations.borrow_book")
 def borrow_book(isbn, member_id):
     """Allows a member to borrow a book."""
-    if isbn not in books or member_id not in members:
-        return False
-    if books[isbn]["available_copies"] <= 0:
-        return False
-    if isbn in members[member_id]["borrowed_books"]:
-        return False
-
-    books[isbn]["available_copies"] -= 1
-    members[member_id]["borrowed_books"].append(isbn)
+    with _locked_books(isbn):
+        if _borrow_result(isbn, member_id) != OK:
+            return False
+        _apply_borrow(isbn, member_id)
+        store.borrow(isbn, member_id)
+    _checkpoint()
     return True
 
 
+@metrics.timed("operations.return_book")
 def return_book(isbn, member_id):
     """Allows a member to return a borrowed book."""
-    if isbn not in books or member_id not in members:
-        return False
-    if isbn not in members[member_id]["borrowed_books"]:
-        return False
-
-    books[isbn]["available_copies"] += 1
-    members[member_id]["borrowed_books"].remove(isbn)
+    with _locked_books(isbn):
+        if _return_result(isbn, member_id) != OK:
+            return False
+        _apply_return(isbn, member_id)
+        store.return_book(isbn, member_id)
+    _checkpoint()
     return True
 
 
+# ==============================
+# Batch Circulation Functions
+# ==============================
+
+def _log_batch(action, pairs, results, username):
+    """Writes one audit record summarising a whole batch."""
+    failures = {}
+    for code in results:
+        if code != OK:
+            failures[code] = failures.get(code, 0) + 1
+    details = ", ".join(f"{code}: {count}" for code, count in sorted(failures.items()))
+    message = f"{action} batch of {len(pairs)}: {results.count(OK)} succeeded"
+    if details:
+        message += f" ({details})"
+    security.log_event(username or "system", message)
+
+
+@metrics.timed("operations.borrow_books")
+def borrow_books(pairs, atomic=False, username=None):
+    """
+    Lends many books at once, for example a whole class checking out books.
+    pairs is a list of (isbn, member_id). Returns one result code per pair,
+    in the same order. The whole batch is checked first, counting copies
+    already taken earlier in the same batch. With atomic=True nothing is
+    lent unless every pair can be, and valid pairs get NOT_APPLIED instead.
+    A single audit record is written for the batch under username,
+    normally the name on the desk's session.
+    """
+    pairs = list(pairs)
+    with _locked_books(*(isbn for isbn, _ in pairs)):
+        results, taken, pending = [], {}, set()
+        for isbn, member_id in pairs:
+            code = _borrow_result(isbn, member_id)
+            if code == OK:
+                if (isbn, member_id) in pending:
+                    code = ALREADY_BORROWED
+                elif books[isbn].available_copies - taken.get(isbn, 0) <= 0:
+                    code = NO_COPIES_LEFT
+                else:
+                    taken[isbn] = taken.get(isbn, 0) + 1
+                    pending.add((isbn, member_id))
+            results.append(code)
+
+        if atomic and len(pending) < len(pairs):
+            results = [NOT_APPLIED if code == OK else code for code in results]
+        else:
+            lent = [pair for pair, code in zip(pairs, results) if code == OK]
+            for isbn, member_id in lent:
+                _apply_borrow(isbn, member_id)
+            store.borrow_many(lent)
+    _checkpoint()
+    _log_batch("Checkout", pairs, results, username)
+    return results
+
+
+@metrics.timed("operations.return_books")
+def return_books(pairs, atomic=False, username=None):
+    """
+    Takes back many books at once, for example the end-of-day drop box.
+    Works like borrow_books: one result code per (isbn, member_id) pair,
+    an optional all-or-nothing mode and a single audit record.
+    """
+    pairs = list(pairs)
+    with _locked_books(*(isbn for isbn, _ in pairs)):
+        results, pending = [], set()
+        for isbn, member_id in pairs:
+            code = _return_result(isbn, member_id)
+            if code == OK:
+                if (isbn, member_id) in pending:
+                    code = NOT_BORROWED
+                else:
+                    pending.add((isbn, member_id))
+            results.append(code)
+
+        if atomic and len(pending) < len(pairs):
+            results = [NOT_APPLIED if code == OK else code for code in results]
+        else:
+            returned = [pair for pair, code in zip(pairs, results) if code == OK]
+            for isbn, member_id in returned:
+                _apply_return(isbn, member_id)
+            store.return_many(returned)
+    _checkpoint()
+    _log_batch("Return", pairs, results, username)
+    return results
+
+
 # ==============================
 # System Summary
 # ==============================
 
+@metrics.timed("operations.summary")
+def summary():
+    """
+    Returns the current library totals as a dictionary.
+    The totals are kept up to date as the data changes, so this is cheap
+    enough to call as often as needed.
+    """
+    available_change = sum(changes[0] for changes in _loan_changes)
+    loans_change = sum(changes[1] for changes in _loan_changes)
+    return {
+        "total_books": stats["total_titles"],
+        "total_members": len(members),
+        "total_copies": stats["total_copies"],
+        "available_copies": stats["available_copies"] + available_change,
+        "borrowed_books": stats["active_loans"] + loans_change,
+        "genres": dict(stats["genres"]),
+    }
+
+
 def system_summary():
     """Displays a summary of total books, members, and borrowed books."""
-    total_books = len(books)
-    total_members = len(members)
-    borrowed_books = sum(
-        len(member["borrowed_books"]) for member in members.values()
-    )
+    totals = summary()
 
     print("\n=== System Summary ===")
-    print(f"Total Books: {total_books}")
-    print(f"Total Members: {total_members}")
-    print(f"Total Books Borrowed: {borrowed_books}")
+    print(f"Total Books: {totals['total_books']}")
+    print(f"Total Members: {totals['total_members']}")
+    print(f"Total Books Borrowed: {totals['borrowed_books']}")
+    print(f"Copies Available: {totals['available_copies']} of {totals['total_copies']}")
+
+
+# ==============================
+# Bulk Import Functions
+# ==============================
+
+BULK_CHUNK_SIZE = 5000   # Rows validated and saved together
+
+
+def read_records(source, fmt=None):
+    """
+    Yields (line number, row) pairs from a CSV file with a header line or a
+    JSON Lines file with one object per line. source can be a file name or
+    any iterable of lines; fmt is "csv" or "jsonl" and, for file names, is
+    worked out from the extension when not given. Rows that cannot be read
+    are yielded as None so they can be reported.
+    """
+    if isinstance(source, str):
+        if fmt is None:
+            fmt = "jsonl" if source.endswith((".jsonl", ".json")) else "csv"
+        with open(source, "r", encoding="utf-8", newline="") as lines:
+            yield from read_records(lines, fmt)
+        return
+
+    if fmt in (None, "csv"):
+        reader = csv.reader(source)
+        header = [name.strip() for name in next(reader, [])]
+        for values in reader:
+            if values:
+                yield reader.line_num, dict(zip(header, values))
+    elif fmt == "jsonl":
+        for line_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _chunks(rows, size):
+    """Splits an iterable into lists of at most size items."""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _missing_field(fields, values):
+    """Returns the first required field whose value is empty or missing, if any."""
+    # Checking the whole row at once first keeps the common case fast
+    if None not in values and "" not in values:
+        return None
+    for field, value in zip(fields, values):
+        if value is None or value == "":
+            return field
+    return None
+
+
+BOOK_IMPORT_FIELDS = ("isbn", "title", "author", "genre", "total_copies")
+MEMBER_IMPORT_FIELDS = ("member_id", "name", "email")
+
+
+def _not_text(fields, values):
+    """Returns the first field whose value is not text, if any. JSON rows may hold numbers."""
+    for field, value in zip(fields, values):
+        if not isinstance(value, str):
+            return field
+    return None
+
+
+def _whole_number(value):
+    """Returns value as an int if it is a whole number (or its text), otherwise None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _validate_books(chunk):
+    """Splits a chunk of rows into new (isbn, Book) pairs and (line, reason) rejects."""
+    valid, rejected, seen = [], [], set()
+    for line_number, row in chunk:
+        if row is None:
+            rejected.append((line_number, "unreadable row"))
+            continue
+        values = [row.get(field) for field in BOOK_IMPORT_FIELDS]
+        missing = _missing_field(BOOK_IMPORT_FIELDS, values)
+        if missing:
+            rejected.append((line_number, f"missing {missing}"))
+            continue
+        isbn, title, author, genre, copies = values
+        wrong = _not_text(BOOK_IMPORT_FIELDS[1:4], values[1:4])
+        if wrong:
+            rejected.append((line_number, f"invalid {wrong}"))
+            continue
+        copies = _whole_number(copies)
+        if copies is None or copies < 0:
+            rejected.append((line_number, "invalid total_copies"))
+            continue
+        isbn = str(isbn).strip()
+        if isbn in books or isbn in seen:
+            rejected.append((line_number, f"duplicate ISBN {isbn}"))
+            continue
+        seen.add(isbn)
+        valid.append((isbn, Book(title, author, genre, copies)))
+    return valid, rejected
+
+
+def _validate_members(chunk):
+    """Splits a chunk of rows into new (member_id, Member) pairs and (line, reason) rejects."""
+    valid, rejected, seen = [], [], set()
+    for line_number, row in chunk:
+        if row is None:
+            rejected.append((line_number, "unreadable row"))
+            continue
+        values = [row.get(field) for field in MEMBER_IMPORT_FIELDS]
+        missing = _missing_field(MEMBER_IMPORT_FIELDS, values)
+        if missing:
+            rejected.append((line_number, f"missing {missing}"))
+            continue
+        member_id, name, email = values
+        wrong = _not_text(MEMBER_IMPORT_FIELDS[1:], values[1:])
+        if wrong:
+            rejected.append((line_number, f"invalid {wrong}"))
+            continue
+        member_id = str(member_id).strip()
+        if member_id in members or member_id in seen:
+            rejected.append((line_number, f"duplicate member ID {member_id}"))
+            continue
+        seen.add(member_id)
+        valid.append((member_id, Member(name, email)))
+    return valid, rejected
+
+
+@metrics.timed("operations.bulk_add_books")
+def bulk_add_books(source, fmt=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Adds every valid book from a CSV or JSON Lines source (see read_records)
+    with columns isbn, title, author, genre and total_copies.
+    Rows are checked and saved a chunk at a time, and the search index is
+    updated once for all of them at the end, so books sharing words share
+    the indexing work. Bad rows are skipped, not fatal. If the source
+    itself cannot be read to the end, the error is raised, but the rows
+    already saved are still indexed.
+    Returns {"added": count, "rejected": [(line number, reason), ...]}.
+    """
+    added, rejected = [], []
+    with _catalog_lock:
+        try:
+            for chunk in _chunks(read_records(source, fmt), chunk_size):
+                valid, bad = _validate_books(chunk)
+                rejected.extend(bad)
+                chunk_isbns = [isbn for isbn, _ in valid]
+                # As in add_book, books are saved and counted before they
+                # are published, with their stripes held
+                with _locked_books(*chunk_isbns):
+                    store.add_books(valid)
+                    genres, copies = stats["genres"], 0
+                    for _, book in valid:
+                        copies += book.total_copies
+                        genres[book.genre] = genres.get(book.genre, 0) + 1
+                    stats["total_titles"] += len(valid)
+                    stats["total_copies"] += copies
+                    stats["available_copies"] += copies
+                    books.update(valid)
+                    added.extend(chunk_isbns)
+        finally:
+            _index_books(added)
+            if added:
+                clear_search_cache()
+    _checkpoint()
+    return {"added": len(added), "rejected": rejected}
+
+
+@metrics.timed("operations.bulk_add_members")
+def bulk_add_members(source, fmt=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Adds every valid member from a CSV or JSON Lines source with columns
+    member_id, name and email. Works like bulk_add_books.
+    """
+    added, rejected = 0, []
+    with _catalog_lock:
+        for chunk in _chunks(read_records(source, fmt), chunk_size):
+            valid, bad = _validate_members(chunk)
+            rejected.extend(bad)
+            for member_id, member in valid:
+                members[member_id] = member
+            store.add_members(valid)
+            added += len(valid)
+    _checkpoint()
+    return {"added": added, "rejected": rejected}
+
+
+# ==============================
+# Persistence
+# ==============================
+
+def load_state(book_rows, member_rows, loan_rows):
+    """
+    Replaces all in-memory data with the given rows and rebuilds the search
+    index, borrowers index and running totals from them.
+    """
+    with _catalog_lock, _locked_everything():
+        _replace_state(book_rows, member_rows, loan_rows)
+
+
+def _replace_state(book_rows, member_rows, loan_rows):
+    """Does the work of load_state. The caller must hold every lock."""
+    books.clear()
+    members.clear()
+    borrowers.clear()
+    search_index.clear()
+    fuzzy_words.clear()
+    trigram_index.clear()
+    clear_search_cache()
+    stats.update(total_titles=0, total_copies=0, available_copies=0,
+                 active_loans=0, genres={})
+    for changes in _loan_changes:
+        changes[:] = [0, 0]
+
+    for isbn, title, author, genre, total_copies, available_copies in book_rows:
+        books[isbn] = Book(title, author, genre, total_copies, available_copies)
+        _count_book(books[isbn], 1)
+    _index_books(books)
+    for member_id, name, email in member_rows:
+        members[member_id] = Member(name, email)
+    for isbn, member_id in loan_rows:
+        members[member_id].borrowed_books.add(isbn)
+        borrowers.setdefault(isbn, set()).add(member_id)
+        stats["active_loans"] += 1
+    # Only once the new index is complete, so no search stores a result
+    # taken from a half-built one
+    clear_search_cache()
+
+
+def use_storage(backend):
+    """
+    Switches to a different storage backend. If the backend already holds
+    data, that data replaces what is in memory; if it is empty, the current
+    data (such as the preloaded samples) is saved into it.
+    """
+    global store
+    with _catalog_lock, _locked_everything():
+        if backend.is_empty():
+            backend.save_all(books, members)
+        else:
+            _replace_state(*backend.load())
+        backend.attach(books, members)
+        store.close()
+        store = backend
 
 
 # ==============================
@@ -214,14 +1282,7 @@ sample_books = [
 ]
 
 for isbn, title, author, genre, copies in sample_books:
-    if isbn not in books:
-        books[isbn] = {
-            "title": title,
-            "author": author,
-            "genre": genre,
-            "total_copies": copies,
-            "available_copies": copies
-        }
+    add_book(isbn, title, author, genre, copies)
 
 # Preloaded Members
 sample_members = [
@@ -238,9 +1299,4 @@ sample_members = [
 ]
 
 for member_id, name, email in sample_members:
-    if member_id not in members:
-        members[member_id] = {
-            "name": name,
-            "email": email,
-            "borrowed_books": []
-        }
+    add_member(member_id, name, email)
@@ -0,0 +1,127 @@
+# ================================================
+# ReadEasy Mini Library Management System
+#
+# PROG211 - Individual Assignment
+# Student: Joshua Mohamed Katibi Yaffa
+# ID: 905004075
+# Class: BSEM1101
+# Semester: 3
+# Year: 2
+#
+# Profiling Module - Diagnosing Slow Sessions
+#
+# GitHub: JoshuaYaffa/SmartLibrary-Group-I
+# ================================================
+
+"""
+This module records where the time and memory of one menu session go,
+so a desk that feels slow can be diagnosed afterwards from its report.
+
+While profiling, cProfile records every function call and tracemalloc
+records memory use. Each menu action is timed separately. Wall time
+includes the time spent typing at the prompts; CPU time leaves it out,
+so it shows what the program itself was doing. When the session ends a
+text report and a .prof file (for pstats or snakeviz) are written.
+"""
+
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+# Where the reports are written
+PROFILE_FOLDER = os.path.join("logs", "profiles")
+
+# Function calls listed in the report, slowest first
+PROFILE_TOP_FUNCTIONS = 30
+
+
+# ==============================
+# Session Profiler
+# ==============================
+
+class SessionProfiler:
+    """Profiles one menu session, keeping totals for each menu action."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.actions = {}       # label -> [count, wall, cpu, slowest wall, peak bytes]
+        self.current = None     # (label, wall start, cpu start, bytes at start)
+        self.started = None
+        self.snapshot = None    # Memory still held when profiling stopped
+        self.peak = 0
+
+    def start(self):
+        """Starts recording calls and memory."""
+        self.started = datetime.datetime.now()
+        tracemalloc.start()
+        self.profile.enable()
+
+    def start_action(self, label):
+        """Starts timing a menu action, ending any action still running."""
+        self.end_action()
+        tracemalloc.reset_peak()
+        self.current = (label, time.perf_counter(), time.process_time(),
+                        tracemalloc.get_traced_memory()[0])
+
+    def end_action(self):
+        """Ends the running menu action, if any, and adds it to the totals."""
+        if self.current is None:
+            return
+        label, wall_start, cpu_start, bytes_start = self.current
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        peak = tracemalloc.get_traced_memory()[1] - bytes_start
+        totals = self.actions.setdefault(label, [0, 0.0, 0.0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += cpu
+        totals[3] = max(totals[3], wall)
+        totals[4] = max(totals[4], peak)
+        self.current = None
+
+    def stop(self):
+        """Stops recording."""
+        self.end_action()
+        self.profile.disable()
+        if tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def report(self, username):
+        """Returns the text of the report."""
+        out = io.StringIO()
+        out.write(f"ReadEasy profile for {username}, session started {self.started:%Y-%m-%d %H:%M:%S}\n")
+        out.write(f"Peak traced memory: {self.peak / 1024:.1f} KiB\n\n")
+
+        out.write("=== Menu Actions (slowest CPU first) ===\n")
+        out.write("{:<36} {:>6} {:>10} {:>10} {:>10} {:>12}\n".format(
+            "Action", "Count", "Wall s", "CPU s", "Max wall s", "Peak KiB"))
+        ranked = sorted(self.actions.items(), key=lambda item: -item[1][2])
+        for label, (count, wall, cpu, slowest, peak) in ranked:
+            out.write("{:<36} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>12.1f}\n".format(
+                label, count, wall, cpu, slowest, peak / 1024))
+
+        out.write("\n=== Largest Memory Allocations Still Held ===\n")
+        for stat in self.snapshot.statistics("lineno")[:10]:
+            out.write(f"{stat}\n")
+
+        out.write(f"\n=== Function Calls (top {PROFILE_TOP_FUNCTIONS} by cumulative time) ===\n")
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def write_report(self, username, folder=PROFILE_FOLDER):
+        """Stops recording and writes the report and .prof file. Returns the report's path."""
+        self.stop()
+        os.makedirs(folder, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() else "_" for c in username) or "user"
+        base = os.path.join(folder, f"profile-{safe_name}-{self.started:%Y%m%d-%H%M%S}")
+        self.profile.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as report_file:
+            report_file.write(self.report(username))
+        return base + ".txt"
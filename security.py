@@ -17,17 +17,33 @@
 This module handles all security and audit-related operations for the system.
 It manages user authentication, roles, login tracking, and audit logs.
 All logins, logouts, and major system actions are recorded with timestamps.
+
+Every login creates a Session. Many sessions can be open at once (one per
+desk), and each is passed to has_access and the menus instead of being
+kept in a single global.
 """
 
+import atexit
+import bisect
+import collections
 import datetime
+import gzip
+import hashlib
+import hmac
+import itertools
+import json
 import os
+import queue
+import secrets
+import sys
+import threading
+import time
+import metrics
 
 # ==============================
 # Global Variables
 # ==============================
 
-current_user = None  # Stores currently logged-in user details
-
 # Directory for storing logs
 LOG_FOLDER = "logs"
 if not os.path.exists(LOG_FOLDER):
@@ -40,42 +56,1054 @@ ERROR_LOG_FILE = os.path.join(LOG_FOLDER, "error_log.txt")
 # Predefined Users and Roles
 # ==============================
 
+# Passwords are stored as salted hashes made by hash_password(), never as
+# plain text. The defaults are admin123 and staff123.
 USERS = {
-    "admin": {"password": "admin123", "role": "admin"},
-    "staff": {"password": "staff123", "role": "staff"}
+    "admin": {
+        "password_hash": "scrypt$16384$8$1$2390f9f3b125887ae7fd331526358c49$"
+                         "c804b5df52edd9069b75ad684ca39c125b2fa63ea8bb249dd9420ed0be3562d2",
+        "role": "admin",
+    },
+    "staff": {
+        "password_hash": "scrypt$16384$8$1$14caab4cea4ee8bee0cfe13ff4c3e277$"
+                         "1579fed08a9cbd267d45c907d13c320c8bbed0b586da0032a47114c47e265b76",
+        "role": "staff",
+    },
+}
+
+# What each role may do. A session gets its role's set when it is created,
+# so checking a permission is a single set lookup. Each set also holds the
+# role names it covers, so has_access("staff", session) still works.
+MEMBER_PERMISSIONS = frozenset({
+    "member", "view_books", "search_books", "borrow", "return",
+})
+STAFF_PERMISSIONS = frozenset({
+    "staff", "view_books", "search_books", "borrow", "return",
+    "view_members", "view_summary",
+})
+ADMIN_PERMISSIONS = MEMBER_PERMISSIONS | STAFF_PERMISSIONS | frozenset({
+    "admin", "manage_books", "manage_members", "view_logs", "view_metrics",
+})
+ROLE_PERMISSIONS = {
+    "admin": ADMIN_PERMISSIONS,
+    "staff": STAFF_PERMISSIONS,
+    "member": MEMBER_PERMISSIONS,
 }
 
 
+# ==============================
+# Password Hashing
+# ==============================
+
+# Cost of new password hashes. Raising SCRYPT_COST (a power of two) makes
+# each guess slower for an attacker but also slows every login down;
+# see bench_login in benchmarks.py. PBKDF2 is used if this Python's
+# OpenSSL has no scrypt.
+SCRYPT_COST = 2 ** 14
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLEL = 1
+PBKDF2_ITERATIONS = 600000
+PASSWORD_SCHEME = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+
+# Checking a password costs tens of milliseconds, so a correct login is
+# remembered for a short while and repeat logins (such as a shift change
+# at several desks) skip the slow check. Only a keyed digest is kept, and
+# the key never leaves this process.
+LOGIN_CACHE_SECONDS = 5 * 60
+LOGIN_CACHE_SIZE = 1000
+
+
+def _derive(scheme, password, salt, cost):
+    """Returns the raw hash of a password for the given scheme and cost values."""
+    if scheme == "scrypt":
+        n, r, p = cost
+        return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32)
+    if scheme == "pbkdf2_sha256":
+        iterations, = cost
+        return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+
+def hash_password(password, scheme=None, cost=None):
+    """
+    Returns a salted hash of a password to store in USERS, such as
+    "scrypt$16384$8$1$<salt>$<hash>". cost is (n, r, p) for scrypt or
+    (iterations,) for PBKDF2; the settings above are used by default.
+    """
+    scheme = scheme or PASSWORD_SCHEME
+    if cost is None:
+        cost = ((SCRYPT_COST, SCRYPT_BLOCK_SIZE, SCRYPT_PARALLEL) if scheme == "scrypt"
+                else (PBKDF2_ITERATIONS,))
+    salt = os.urandom(16)
+    digest = _derive(scheme, password, salt, cost)
+    return "$".join([scheme, *map(str, cost), salt.hex(), digest.hex()])
+
+
+def verify_password(password, stored):
+    """
+    Returns True if the password matches a hash made by hash_password.
+    A malformed hash, or a scrypt hash on a Python without scrypt, never matches.
+    """
+    try:
+        scheme, *cost, salt, digest = stored.split("$")
+        digest = bytes.fromhex(digest)
+        expected = _derive(scheme, password, bytes.fromhex(salt), tuple(map(int, cost)))
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return hmac.compare_digest(expected, digest)
+
+
+class LoginCache:
+    """
+    Remembers recent correct logins for LOGIN_CACHE_SECONDS. Entries are
+    keyed by an HMAC of the username, password and stored hash under a
+    random per-process key, so changing a password drops its entries.
+    """
+
+    def __init__(self, seconds=LOGIN_CACHE_SECONDS, size=LOGIN_CACHE_SIZE):
+        self.seconds = seconds
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._key = secrets.token_bytes(32)
+        self._verified = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, username, password, stored):
+        message = "\0".join((username, password, stored)).encode("utf-8")
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check(self, username, password, stored):
+        """Returns True if the password matches, using the cache when possible."""
+        entry = self._entry(username, password, stored)
+        now = time.monotonic()
+        with self._lock:
+            verified_at = self._verified.get(entry)
+            if verified_at is not None and now - verified_at <= self.seconds:
+                self.hits += 1
+                return True
+            self.misses += 1
+        if not verify_password(password, stored):
+            return False
+        with self._lock:
+            self._verified[entry] = now
+            self._verified.move_to_end(entry)
+            while len(self._verified) > self.size:
+                self._verified.popitem(last=False)
+        return True
+
+    def clear(self):
+        """Forgets every remembered login."""
+        with self._lock:
+            self._verified.clear()
+
+
+login_cache = LoginCache()
+
+
+# ==============================
+# Login Rate Limits
+# ==============================
+
+# Every login attempt takes a token from a bucket for its username and one
+# for where it came from (a desk address, or "console"). Buckets refill
+# slowly, so a script retrying in a loop is soon refused without paying
+# for a password check. Repeated wrong passwords also lock the bucket.
+# A correct login gives its username token back, so only failed attempts
+# count against a username.
+LOGIN_USER_BURST = 5           # Failed attempts allowed at once per username
+LOGIN_USER_REFILL = 10.0       # ...then one more every this many seconds
+LOGIN_SOURCE_BURST = 20        # Attempts allowed at once per source
+LOGIN_SOURCE_REFILL = 1.0
+LOGIN_LOCKOUT_FAILURES = 5     # Wrong passwords in a row before a lockout
+LOGIN_LOCKOUT_SECONDS = 5 * 60
+LOGIN_LIMITER_SIZE = 10000     # Buckets kept; the least recently used go first
+
+
+class RateLimiter:
+    """
+    Token buckets kept in memory, one per key, with a lockout after too
+    many failures in a row. At most max_keys buckets are kept; evicting an
+    idle bucket is harmless because a new bucket starts full anyway.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, burst, refill_seconds, lockout_failures=LOGIN_LOCKOUT_FAILURES,
+                 lockout_seconds=LOGIN_LOCKOUT_SECONDS, max_keys=LOGIN_LIMITER_SIZE):
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.lockout_failures = lockout_failures
+        self.lockout_seconds = lockout_seconds
+        self.max_keys = max_keys
+        # key -> [tokens, last refill time, failures in a row, locked until]
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _bucket(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now, 0, 0.0]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            refilled = (now - bucket[1]) / self.refill_seconds
+            bucket[0] = min(self.burst, bucket[0] + refilled)
+            bucket[1] = now
+        return bucket
+
+    def allow(self, key):
+        """Takes a token for an attempt. Returns False if the key must wait."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(key, now)
+            if now < bucket[3] or bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+    def blocked(self, key):
+        """Returns True if an attempt for the key would be refused. Changes nothing."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return False
+            tokens = bucket[0] + (now - bucket[1]) / self.refill_seconds
+            return now < bucket[3] or tokens < 1
+
+    def failed(self, key):
+        """Records a failed attempt, locking the key after too many in a row."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(key, now)
+            bucket[2] += 1
+            if bucket[2] >= self.lockout_failures:
+                bucket[2] = 0
+                bucket[3] = now + self.lockout_seconds
+
+    def succeeded(self, key, refund=False):
+        """Clears the failure count after a successful attempt, optionally giving its token back."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[2] = 0
+                if refund:
+                    bucket[0] = min(self.burst, bucket[0] + 1)
+
+
+user_limiter = RateLimiter(LOGIN_USER_BURST, LOGIN_USER_REFILL)
+source_limiter = RateLimiter(LOGIN_SOURCE_BURST, LOGIN_SOURCE_REFILL)
+_throttled = set()   # (username, source) pairs already logged as throttled
+
+
+def login_blocked(username, source="console"):
+    """Returns True if a login for this user or from this source would be refused."""
+    return user_limiter.blocked(username) or source_limiter.blocked(source)
+
+
+def _login_allowed(username, source):
+    """Applies the rate limits to one attempt, logging only the first refusal in a row."""
+    if user_limiter.allow(username) and source_limiter.allow(source):
+        _throttled.discard((username, source))
+        return True
+    # The audit log is buffered, but a script could still flood it, so only
+    # the start of each run of refused attempts is recorded
+    if (username, source) not in _throttled:
+        if len(_throttled) >= LOGIN_LIMITER_SIZE:
+            _throttled.clear()
+        _throttled.add((username, source))
+        log_event(username, f"Login attempts throttled from {source}")
+    return False
+
+
+# ==============================
+# Sessions
+# ==============================
+
+SESSION_TIMEOUT = 30 * 60   # Seconds of inactivity before a session expires
+MAX_SESSIONS = 1000         # Oldest idle sessions are evicted beyond this
+
+
+class Session:
+    """
+    One logged-in user. Sessions are created by login() and looked up by
+    their random token. They can also be read like the old current_user
+    dictionary, e.g. session["username"].
+    """
+
+    __slots__ = ("token", "username", "role", "permissions", "started", "last_seen")
+
+    def __init__(self, username, role):
+        self.token = secrets.token_hex(16)
+        self.username = username
+        self.role = role
+        self.permissions = ROLE_PERMISSIONS.get(role, frozenset())
+        self.started = self.last_seen = time.monotonic()
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __repr__(self):
+        return f"Session({self.username!r}, {self.role!r})"
+
+
+class SessionTable:
+    """
+    Keeps the open sessions in memory, least recently used first. A session
+    expires after timeout seconds without use, and once more than
+    max_sessions are open the least recently used one is evicted.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, timeout=SESSION_TIMEOUT, max_sessions=MAX_SESSIONS):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, username, role):
+        """Opens a new session and returns it."""
+        session = Session(username, role)
+        with self._lock:
+            self._remove_expired(session.started)
+            self._sessions[session.token] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, token):
+        """Returns the live session with this token, or None. Counts as activity."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if now - session.last_seen > self.timeout:
+                del self._sessions[token]
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(token)
+            return session
+
+    def is_active(self, session):
+        """Returns True if the session is open and has not timed out. Changes nothing."""
+        return (self._sessions.get(session.token) is session and
+                time.monotonic() - session.last_seen <= self.timeout)
+
+    def end(self, token):
+        """Closes a session. Returns the session, or None if it was not open."""
+        with self._lock:
+            return self._sessions.pop(token, None)
+
+    def expire(self):
+        """Closes every session that has timed out and returns how many were closed."""
+        with self._lock:
+            return self._remove_expired(time.monotonic())
+
+    def _remove_expired(self, now):
+        # Least recently used come first, so stop at the first live session
+        removed = 0
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.timeout:
+                break
+            del self._sessions[token]
+            removed += 1
+        return removed
+
+
+sessions = SessionTable()
+
+
+# ==============================
+# Log Writer Settings
+# ==============================
+
+# "sync" writes every record to disk straight away.
+# "buffered" groups records in memory and writes them together, which is
+# much faster but can lose the last few records if the program crashes.
+# "async" hands records to a background thread so callers never wait for
+# the disk at all.
+LOG_MODES = ("sync", "buffered", "async")
+LOG_MODE = "buffered"
+
+LOG_BUFFER_SIZE = 100      # Write once this many records are waiting
+LOG_FLUSH_INTERVAL = 2.0   # ...or once the oldest waiting record is this old (seconds)
+
+# What the background thread's queue does when it is full:
+# "block" waits for space, "drop_oldest" discards the oldest waiting record
+# and "drop_newest" discards the new record. Dropped records are counted.
+LOG_QUEUE_POLICIES = ("block", "drop_oldest", "drop_newest")
+LOG_QUEUE_POLICY = "block"
+LOG_QUEUE_SIZE = 10000
+
+# When the live log file is archived. Archives are gzip files kept next to
+# the live file and listed, oldest first, in a manifest file.
+LOG_MAX_BYTES = 5 * 1024 * 1024   # Rotate once the live file reaches this size
+LOG_ROTATE_DAILY = True           # Rotate when the first record of a new day arrives
+
+# The audit log keeps a small side index so that time range and per-user
+# queries can jump straight to the right part of the file. Records are
+# grouped into blocks; the index stores where each block starts, its first
+# timestamp and which users appear in it.
+LOG_INDEX_INTERVAL = 256   # Records per index block
+LOG_INDEX_REBUILD_LINES = 4096   # Lines read at a time when rebuilding an index
+
+
+class LogWriter:
+    """
+    Collects log lines for one file and writes them to disk in batches.
+    With indexed=True it also maintains the side index read by read_log.
+    """
+
+    def __init__(self, path, indexed=False):
+        self.path = path
+        self.pending = []
+        self.oldest = None   # When the oldest pending line was added
+        self.timer = None    # Writes the pending lines once they are LOG_FLUSH_INTERVAL old
+        self.lock = threading.Lock()
+        self.day = None      # Day of the records in the live file
+        if os.path.exists(path):
+            self.day = datetime.date.fromtimestamp(os.path.getmtime(path))
+
+        self.index_path = index_file(path) if indexed else None
+        self.block_offset = 0      # Where the current index block starts
+        self.block_size = 0        # Records in the current index block
+        self.block_users = set()   # Users already indexed in the current block
+        if self.index_path:
+            self._check_index()
+
+    def write(self, line):
+        """Adds a line to the log, writing the batch if it is due."""
+        if LOG_MODE == "async":
+            background_writer.submit(self, line)
+            return
+        with self.lock:
+            self.pending.append(line)
+            now = time.monotonic()
+            if self.oldest is None:
+                self.oldest = now
+            if (LOG_MODE == "sync" or len(self.pending) >= LOG_BUFFER_SIZE or
+                    now - self.oldest >= LOG_FLUSH_INTERVAL):
+                self._write_pending()
+            elif self.timer is None:
+                # Without this a lone record would wait for the next one
+                self.timer = threading.Timer(LOG_FLUSH_INTERVAL, self._timed_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Writes every pending line to disk."""
+        with self.lock:
+            self._write_pending()
+
+    def _timed_flush(self):
+        with self.lock:
+            if self.timer is threading.current_thread():
+                self.timer = None
+            try:
+                self._write_pending()
+            except Exception as error:
+                # Nobody is waiting on this thread; the lines stay pending
+                print(f"Could not write {self.path}: {error}", file=sys.stderr)
+
+    def _write_pending(self):
+        if not self.pending:
+            return
+        today = datetime.date.today()
+        if self._rotation_due(today):
+            self.rotate()
+        encoded = [line.encode("utf-8") for line in self.pending]
+        with open(self.path, "ab") as log_file:
+            offset = log_file.tell()
+            log_file.write(b"".join(encoded))
+        if self.index_path:
+            self._index_lines(self.pending, encoded, offset)
+        self.day = today
+        self.pending = []
+        self.oldest = None
+        if self.timer is not None and self.timer is not threading.current_thread():
+            self.timer.cancel()
+            self.timer = None
+
+    def _rotation_due(self, today):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return False
+        if size == 0:
+            return False
+        if size >= LOG_MAX_BYTES:
+            return True
+        return LOG_ROTATE_DAILY and self.day is not None and self.day != today
+
+    def rotate(self):
+        """
+        Compresses the live log file into a gzip archive, records it in the
+        manifest and starts a new, empty live file.
+        """
+        if not os.path.exists(self.path):
+            return
+        base = os.path.splitext(self.path)[0]
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        archive = f"{base}.{stamp}.txt.gz"
+        counter = 1
+        while os.path.exists(archive):
+            counter += 1
+            archive = f"{base}.{stamp}-{counter}.txt.gz"
+
+        first = last = None
+        lines = 0
+        with open(self.path, "rb") as live_file, gzip.open(archive, "wb") as gz_file:
+            for line in live_file:
+                gz_file.write(line)
+                lines += 1
+                if first is None:
+                    first = line
+                last = line
+        segment = {
+            "file": os.path.basename(archive),
+            "first": record_timestamp(first),
+            "last": record_timestamp(last),
+            "lines": lines,
+            "bytes": os.path.getsize(self.path),
+        }
+        # List the archive before removing the live file, so a crash in
+        # between leaves records twice rather than an archive nobody reads
+        manifest = read_manifest(self.path)
+        manifest.append(segment)
+        manifest_path = manifest_file(self.path)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as out:
+            json.dump(manifest, out, indent=1)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        os.remove(self.path)
+        if self.index_path:
+            self._remove_index()
+
+    def _index_lines(self, lines, encoded, offset):
+        """Adds index entries for lines just written at the given byte offset."""
+        entries = []
+        for line, data in zip(lines, encoded):
+            if self.block_size == 0 or self.block_size >= LOG_INDEX_INTERVAL:
+                self.block_offset, self.block_size, self.block_users = offset, 0, set()
+                entries.append({"t": record_timestamp(line) or "", "o": offset})
+            record = parse_log_line(line)
+            if record is not None and record.user is not None and record.user not in self.block_users:
+                self.block_users.add(record.user)
+                entries.append({"u": record.user, "o": self.block_offset})
+            self.block_size += 1
+            offset += len(data)
+        with open(self.index_path, "a", encoding="utf-8") as index:
+            index.write("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    def _check_index(self):
+        """Rebuilds the index if it is missing for an existing live file."""
+        if not os.path.exists(self.path):
+            self._remove_index()
+        elif not os.path.exists(self.index_path):
+            # Read in batches of lines, as the log may be far too big for memory
+            offset = 0
+            with open(self.path, "rb") as log_file:
+                while True:
+                    encoded = list(itertools.islice(log_file, LOG_INDEX_REBUILD_LINES))
+                    if not encoded:
+                        break
+                    lines = [data.decode("utf-8", errors="replace") for data in encoded]
+                    self._index_lines(lines, encoded, offset)
+                    offset += sum(len(data) for data in encoded)
+        # New records always start a fresh block
+        self.block_size = 0
+
+    def _remove_index(self):
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
+        self.block_size = 0
+
+
+class BackgroundWriter:
+    """
+    Writes log lines from a separate thread. Callers put lines on a bounded
+    queue and return immediately; the thread writes whatever has queued up
+    in one go.
+    """
+
+    def __init__(self, queue_size=LOG_QUEUE_SIZE, policy=LOG_QUEUE_POLICY):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.policy = policy
+        self.dropped = 0     # Records discarded because the queue was full
+        self.failures = 0    # Batches that could not be written
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Starts the writer thread if it is not already running."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Writes everything still queued and stops the writer thread."""
+        if self.thread is None:
+            return
+        if not self.thread.is_alive():
+            self.drain()
+            self.thread = None
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def submit(self, writer, line):
+        """Queues a line for the writer thread, following the queue policy."""
+        item = (writer, line)
+        if self._thread_died():
+            # Nobody would ever write it, so write it here instead
+            self.drain()
+            self._write_batch([item])
+            return
+        if self.policy == "block":
+            self.queue.put(item)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                if self.policy == "drop_newest":
+                    self._count_drop()
+                    return
+            # drop_oldest: make room by discarding the oldest record
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self._count_drop()
+            except queue.Empty:
+                pass
+
+    def drain(self):
+        """Waits until every queued line has been written."""
+        if self.thread is None:
+            return
+        if not self._thread_died():
+            self.queue.join()
+            return
+        # The thread is gone, so write what it left behind here
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._write_batch([item])
+            finally:
+                self.queue.task_done()
+
+    def _thread_died(self):
+        return self.thread is not None and not self.thread.is_alive()
+
+    def _count_drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def _write_batch(self, batch):
+        """Writes a batch of queued lines. Failures are reported, not raised."""
+        writers = set()
+        for item in batch:
+            if item is None:
+                continue
+            writer, line = item
+            with writer.lock:
+                writer.pending.append(line)
+            writers.add(writer)
+        for writer in writers:
+            try:
+                writer.flush()
+            except Exception as error:
+                # The lines stay pending, so the next flush tries them again
+                with self.lock:
+                    self.failures += 1
+                print(f"Could not write {writer.path}: {error}", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < LOG_BUFFER_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if None in batch:
+                return
+
+
+# ==============================
+# Log Archive Helpers
+# ==============================
+
+def record_timestamp(line):
+    """Returns the "YYYY-MM-DD HH:MM:SS" timestamp at the start of a log line."""
+    if not line:
+        return None
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    if line.startswith("[") and line[20:21] == "]":
+        return line[1:20]
+    return None
+
+
+def manifest_file(path):
+    """Returns the manifest file that lists the archives of a log file."""
+    return os.path.splitext(path)[0] + ".manifest.json"
+
+
+def read_manifest(path):
+    """Returns the archived segments of a log file, oldest first."""
+    try:
+        with open(manifest_file(path), "r", encoding="utf-8") as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return []
+
+
+def log_segments(path, since=None, until=None):
+    """
+    Returns every file holding part of a log's history, oldest first.
+    Archives that lie completely outside the since/until range are skipped.
+    """
+    folder = os.path.dirname(path)
+    segments = []
+    for segment in read_manifest(path):
+        if since and segment["last"] and segment["last"] < since:
+            continue
+        if until and segment["first"] and segment["first"][:len(until)] > until:
+            continue
+        segments.append(os.path.join(folder, segment["file"]))
+    segments.append(path)
+    return segments
+
+
+def open_log_segment(segment):
+    """Opens a live or archived log file for reading as text."""
+    if segment.endswith(".gz"):
+        return gzip.open(segment, "rt", encoding="utf-8")
+    return open(segment, "r", encoding="utf-8")
+
+
+def index_file(path):
+    """Returns the side index file of a live log file."""
+    return os.path.splitext(path)[0] + ".idx"
+
+
+def load_log_index(path):
+    """
+    Returns the side index of a live log as (blocks, user_blocks), where
+    blocks is a list of (first timestamp, byte offset) pairs and user_blocks
+    maps each user to the offsets of the blocks they appear in.
+    Returns None if the log has no index.
+    """
+    blocks, user_blocks = [], {}
+    try:
+        with open(index_file(path), "r", encoding="utf-8") as index:
+            for line in index:
+                entry = json.loads(line)
+                if "t" in entry:
+                    blocks.append((entry["t"], entry["o"]))
+                else:
+                    user_blocks.setdefault(entry["u"], []).append(entry["o"])
+    except FileNotFoundError:
+        return None
+    return blocks, user_blocks
+
+
+def _read_live_lines(path, since=None, until=None, user=None):
+    """
+    Yields the lines of the live log that may match the filters, using the
+    side index to skip blocks before since and blocks without the user.
+    Falls back to reading the whole file when there is no usable index.
+    """
+    index = load_log_index(path)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return
+    if not index or not index[0] or index[0][0][1] != 0 or index[0][-1][1] > size:
+        with open(path, "r", encoding="utf-8") as log_file:
+            yield from log_file
+        return
+
+    blocks, user_blocks = index
+    offsets = [offset for _, offset in blocks]
+    first = 0
+    if since:
+        first = max(bisect.bisect_right([stamp for stamp, _ in blocks], since) - 1, 0)
+    if user is None:
+        ranges = [(offsets[first], size)]
+    else:
+        ends = dict(zip(offsets, offsets[1:] + [size]))
+        ranges = [(start, ends.get(start, size))
+                  for start in user_blocks.get(user, ()) if start >= offsets[first]]
+
+    with open(path, "rb") as log_file:
+        for start, end in ranges:
+            log_file.seek(start)
+            position = start
+            while position < end:
+                data = log_file.readline()
+                if not data:
+                    break
+                position += len(data)
+                line = data.decode("utf-8", errors="replace")
+                stamp = record_timestamp(line)
+                if until and stamp and stamp[:len(until)] > until:
+                    return
+                yield line
+
+
+def read_log_lines(path, since=None, until=None, user=None):
+    """
+    Yields every line of a log, including archived segments, oldest first.
+    The filters only let the reader skip parts of the log that cannot match;
+    the lines still need to be checked by the caller.
+    """
+    for segment in log_segments(path, since, until):
+        if segment == path:
+            yield from _read_live_lines(path, since, until, user)
+            continue
+        try:
+            with open_log_segment(segment) as log_file:
+                yield from log_file
+        except FileNotFoundError:
+            continue
+
+
+def read_lines_backwards(path, block_size=64 * 1024):
+    """Yields the lines of a file newest first, reading it from the end in blocks."""
+    try:
+        log_file = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with log_file:
+        position = log_file.seek(0, os.SEEK_END)
+        rest = b""   # Start of a line whose beginning is in an earlier block
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            log_file.seek(position)
+            pieces = (log_file.read(step) + rest).split(b"\n")
+            rest = pieces[0]
+            for piece in reversed(pieces[1:]):
+                if piece:
+                    yield piece.decode("utf-8", errors="replace") + "\n"
+        if rest:
+            yield rest.decode("utf-8", errors="replace") + "\n"
+
+
+# ==============================
+# Log Reading Functions
+# ==============================
+
+# One parsed log line. Error log records have no user.
+LogRecord = collections.namedtuple("LogRecord", ["timestamp", "user", "action"])
+
+
+def parse_log_line(line):
+    """Turns an audit or error log line into a LogRecord, or None if it is not one."""
+    timestamp = record_timestamp(line)
+    if timestamp is None:
+        return None
+    body = line[22:].rstrip("\n")
+    if body.startswith("USER: ") and " - ACTION: " in body:
+        user, action = body[6:].split(" - ACTION: ", 1)
+        return LogRecord(timestamp, user, action)
+    if body.startswith("ERROR: "):
+        return LogRecord(timestamp, None, body[7:])
+    return LogRecord(timestamp, None, body)
+
+
+def _time_text(value):
+    """Accepts a datetime or a "YYYY-MM-DD[ HH:MM[:SS]]" string for log filters."""
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, datetime.date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+def read_log(path, user=None, since=None, until=None, tail=None):
+    """
+    Lazily yields the LogRecords of a log, oldest first, one at a time so
+    memory use does not grow with the size of the log.
+    user keeps only that user's records, since/until keep records inside the
+    time range (until includes the whole minute or day it names), and tail
+    keeps only the last N matching records.
+    """
+    since, until = _time_text(since), _time_text(until)
+
+    def wanted(record):
+        return (record is not None
+                and (user is None or record.user == user)
+                and (since is None or record.timestamp >= since)
+                and (until is None or record.timestamp[:len(until)] <= until))
+
+    if tail is not None and since is None:
+        # Only the end of the log matters, so start there and stop early
+        yield from _read_log_tail(path, tail, wanted, until)
+        return
+    records = (parse_log_line(line) for line in read_log_lines(path, since, until, user))
+    records = (record for record in records if wanted(record))
+    if tail is not None:
+        records = collections.deque(records, maxlen=tail)
+    yield from records
+
+
+def _read_log_tail(path, tail, wanted, until=None):
+    """
+    Returns the last tail records for which wanted() is true, oldest first.
+    The live file is read backwards and archives are opened newest first,
+    stopping as soon as enough records have been found.
+    """
+    found = collections.deque()
+    for segment in reversed(log_segments(path, until=until)):
+        needed = tail - len(found)
+        if needed <= 0:
+            break
+        if segment == path:
+            newest_first = []
+            for line in read_lines_backwards(path):
+                record = parse_log_line(line)
+                if wanted(record):
+                    newest_first.append(record)
+                    if len(newest_first) == needed:
+                        break
+            found.extendleft(newest_first)
+            continue
+        # An archive is compressed, so it can only be read from the start
+        try:
+            with open_log_segment(segment) as log_file:
+                records = (parse_log_line(line) for line in log_file)
+                last = collections.deque((record for record in records if wanted(record)), maxlen=needed)
+        except FileNotFoundError:
+            continue
+        found.extendleft(reversed(last))
+    return found
+
+
+audit_log = LogWriter(AUDIT_LOG_FILE, indexed=True)
+error_log = LogWriter(ERROR_LOG_FILE)
+background_writer = BackgroundWriter()
+
+
+def set_log_mode(mode, queue_policy=None):
+    """
+    Switches between "sync", "buffered" and "async" logging.
+    queue_policy optionally changes what async mode does when its queue is full.
+    """
+    global LOG_MODE
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode: {mode}")
+    if queue_policy is not None:
+        if queue_policy not in LOG_QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {queue_policy}")
+        background_writer.policy = queue_policy
+    flush_logs()
+    if mode == "async":
+        background_writer.start()
+    LOG_MODE = mode
+    if mode != "async":
+        background_writer.stop()
+
+
+@metrics.timed("security.flush_logs")
+def flush_logs():
+    """Writes any buffered or queued audit and error records to disk."""
+    background_writer.drain()
+    audit_log.flush()
+    error_log.flush()
+
+
+# Make sure nothing is left in memory when the program ends
+atexit.register(flush_logs)
+
+
 # ==============================
 # Logging Functions
 # ==============================
 
+@metrics.timed("security.log_event")
 def log_event(username, action):
     """Records a user action into the audit log with timestamp."""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(AUDIT_LOG_FILE, "a", encoding="utf-8") as log_file:
-        log_file.write(f"[{timestamp}] USER: {username} - ACTION: {action}\n")
+    audit_log.write(f"[{timestamp}] USER: {username} - ACTION: {action}\n")
 
 
+@metrics.timed("security.log_error")
 def log_error(message):
     """Records any system error or exception."""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(ERROR_LOG_FILE, "a", encoding="utf-8") as log_file:
-        log_file.write(f"[{timestamp}] ERROR: {message}\n")
+    error_log.write(f"[{timestamp}] ERROR: {message}\n")
 
 
 # ==============================
 # Authentication System
 # ==============================
 
+@metrics.timed("security.login")
+def login(username, password=None, role="member", source="console"):
+    """
+    Checks a user's details and opens a session for them.
+    Admin and staff need their password; members only give their name.
+    source says where the attempt came from, for the rate limits.
+    Returns the new Session, or None if the details are wrong or there
+    have been too many attempts (see login_blocked).
+    """
+    if not username or not _login_allowed(username, source):
+        return None
+
+    if role == "member":
+        user_limiter.succeeded(username, refund=True)
+        session = sessions.create(username, role)
+        log_event(username, "Logged in as member")
+        return session
+
+    user = USERS.get(username)
+    if (user is None or user["role"] != role or not isinstance(password, str) or
+            not login_cache.check(username, password, user["password_hash"])):
+        user_limiter.failed(username)
+        source_limiter.failed(source)
+        return None
+    # Correct logins do not use up the username's attempts, so a whole
+    # shift logging in as "staff" at once is never held back
+    user_limiter.succeeded(username, refund=True)
+    source_limiter.succeeded(source)
+    session = sessions.create(username, role)
+    log_event(username, f"Logged in successfully as {role}")
+    return session
+
+
 def authenticate():
     """
     Handles user login for Admin, Staff, and Members.
     Admin and Staff must provide username and password.
     Members can log in using only their name.
+    Returns the new Session, or None if login failed.
     """
-    global current_user
-
     print("=== Select Role ===")
     print("1. Admin")
     print("2. Staff")
@@ -91,18 +1119,20 @@ def authenticate():
         role = "member"
     else:
         print("Invalid selection.")
-        return False
+        return None
 
     # Member login (name only)
     if role == "member":
         username = input("Enter your name: ").strip()
-        if not username:
-            print("Invalid name. Please try again.")
-            return False
-        current_user = {"username": username, "role": role}
-        log_event(username, "Logged in as member")
+        session = login(username)
+        if session is None:
+            if username and login_blocked(username):
+                print("Too many login attempts. Please wait and try again.")
+            else:
+                print("Invalid name. Please try again.")
+            return None
         print(f"Welcome, {username}! Role: Member")
-        return True
+        return session
 
     # Admin or Staff login (with password)
     print(f"=== Login as {role.capitalize()} ===")
@@ -110,26 +1140,26 @@ def authenticate():
         username = input("Enter username: ").strip()
         password = input("Enter password: ").strip()
 
-        if username in USERS and USERS[username]["password"] == password and USERS[username]["role"] == role:
-            current_user = {"username": username, "role": role}
-            log_event(username, f"Logged in successfully as {role}")
+        session = login(username, password, role)
+        if session is not None:
             print(f"Welcome, {username}! Role: {role.capitalize()}")
-            return True
+            return session
+        elif login_blocked(username):
+            print("Too many login attempts. Please wait and try again.")
+            return None
         else:
             print("Invalid credentials. Try again.")
 
     print("Too many failed attempts. Exiting system.")
-    return False
+    return None
 
 
-def logout():
+def logout(session):
     """Handles user logout and logs it in the audit trail."""
-    global current_user
-    if current_user:
-        username = current_user["username"]
-        log_event(username, "Logged out")
-        print(f"Goodbye, {username}. You have been logged out.")
-        current_user = None
+    if session is not None and sessions.end(session.token) is not None:
+        log_event(session.username, "Logged out")
+        flush_logs()
+        print(f"Goodbye, {session.username}. You have been logged out.")
     else:
         print("No user is currently logged in.")
 
@@ -138,57 +1168,59 @@ def logout():
 # Access Control
 # ==============================
 
-def has_access(required_role):
+def has_access(permission, session=None):
     """
-    Checks if the current user has permission to perform a specific action.
-    Admins have full access; staff and members are restricted.
+    Checks if the session's user may do something, given as a permission
+    from ROLE_PERMISSIONS (or a role name). Admins have full access; staff
+    and members are restricted. Sessions that have expired or been closed
+    have no access. Prints nothing; the menus explain a refusal.
     """
-    if not current_user:
-        print("Access denied. Please log in first.")
-        return False
-
-    user_role = current_user["role"]
-    if user_role == required_role or user_role == "admin":
-        return True
-    else:
-        print(f"Access denied. This action requires {required_role} privileges.")
-        return False
+    return (session is not None and permission in session.permissions and
+            sessions.is_active(session))
 
 
 # ==============================
 # Log Viewing Functions (Admin Only)
 # ==============================
 
-def view_audit_log():
-    """Allows admin to view the system audit trail."""
-    if not has_access("admin"):
+def _show_records(records, page_size):
+    """Prints log records, pausing after every page_size records if set."""
+    shown = 0
+    for record in records:
+        if record.user is None:
+            print(f"[{record.timestamp}] ERROR: {record.action}")
+        else:
+            print(f"[{record.timestamp}] USER: {record.user} - ACTION: {record.action}")
+        shown += 1
+        if page_size and shown % page_size == 0:
+            if input("-- Press Enter for more, or q to stop: ").strip().lower() == "q":
+                break
+    return shown
+
+
+def view_audit_log(session, user=None, since=None, until=None, tail=None, page_size=0):
+    """
+    Allows admin to view the system audit trail, including archived logs.
+    The filters work as in read_log; page_size pauses after each page.
+    """
+    if not has_access("view_logs", session):
         return
     print("\n=== Audit Log ===")
-    try:
-        with open(AUDIT_LOG_FILE, "r", encoding="utf-8") as log_file:
-            content = log_file.read()
-            if content.strip():
-                print(content)
-            else:
-                print("No audit logs recorded yet.")
-    except FileNotFoundError:
-        print("Audit log file not found.")
+    flush_logs()
+    records = read_log(AUDIT_LOG_FILE, user, since, until, tail)
+    if not _show_records(records, page_size):
+        print("No matching audit records found.")
 
 
-def view_error_log():
-    """Allows admin to view all recorded errors."""
-    if not has_access("admin"):
+def view_error_log(session, since=None, until=None, tail=None, page_size=0):
+    """Allows admin to view recorded errors, including archived logs."""
+    if not has_access("view_logs", session):
         return
     print("\n=== Error Log ===")
-    try:
-        with open(ERROR_LOG_FILE, "r", encoding="utf-8") as log_file:
-            content = log_file.read()
-            if content.strip():
-                print(content)
-            else:
-                print("No errors logged yet.")
-    except FileNotFoundError:
-        print("Error log file not found.")
+    flush_logs()
+    records = read_log(ERROR_LOG_FILE, None, since, until, tail)
+    if not _show_records(records, page_size):
+        print("No matching errors found.")
 
 
 # ==============================
@@ -197,7 +1229,8 @@ def view_error_log():
 
 if __name__ == "__main__":
     print("Running security module test...\n")
-    if authenticate():
-        log_event(current_user["username"], "Test event - security module operational")
-        view_audit_log()
-        logout()
+    session = authenticate()
+    if session:
+        log_event(session.username, "Test event - security module operational")
+        view_audit_log(session)
+        logout(session)
@@ -0,0 +1,219 @@
+# ================================================
+# ReadEasy Mini Library Management System
+#
+# PROG211 - Individual Assignment
+# Student: Joshua Mohamed Katibi Yaffa
+# ID: 905004075
+# Class: BSEM1101
+# Semester: 3
+# Year: 2
+#
+# Network Server - Shared Access for Many Desks
+#
+# GitHub: JoshuaYaffa/SmartLibrary-Group-I
+# ================================================
+
+"""
+This file lets many desks and kiosks use one running library at the same
+time over the network. It uses asyncio from the standard library, so one
+process can serve dozens of connections without a thread for each.
+
+Each request is one line of JSON and gets one line of JSON back:
+    {"id": 1, "action": "login", "username": "staff", "password": "staff123", "role": "staff"}
+    {"id": 1, "ok": true, "result": {"username": "staff", "role": "staff"}}
+
+Actions:
+    login    - username, password (not needed for members), role
+    logout
+    search   - keyword, optional limit, optional fuzzy (true to forgive typos)
+    borrow   - isbn, member_id
+    return   - isbn, member_id
+    summary
+
+Every action except login needs the connection to be logged in, and is
+checked with security.has_access. Run with:
+    python server.py
+"""
+
+import asyncio
+import json
+import operations
+import security
+import storage
+
+# Address the server listens on
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+
+MAX_REQUEST_BYTES = 64 * 1024   # Longest request line accepted
+SEARCH_LIMIT = 20               # Results returned by search unless asked otherwise
+
+# Permission needed for each action (see security.ROLE_PERMISSIONS)
+ACTION_PERMISSIONS = {
+    "search": "search_books",
+    "borrow": "borrow",
+    "return": "return",
+    "summary": "view_summary",
+}
+
+
+# ==============================
+# Request Handling
+# ==============================
+
+class ClientError(Exception):
+    """A request that cannot be carried out; the message is sent back."""
+
+
+def _field(request, name):
+    """Returns a required text field of a request."""
+    value = request.get(name)
+    if not isinstance(value, str) or not value:
+        raise ClientError(f"missing {name}")
+    return value
+
+
+def _book_result(isbn, book):
+    """Returns the details of a book sent back by search."""
+    return {"isbn": isbn, "title": book.title, "author": book.author,
+            "genre": book.genre, "available_copies": book.available_copies}
+
+
+async def handle_request(request, desk):
+    """
+    Carries out one request for a connection and returns the result.
+    desk is a dictionary holding the connection's session and address.
+    Raises ClientError for requests that cannot be carried out.
+    """
+    action = request.get("action")
+
+    if action == "login":
+        role = request.get("role", "member")
+        username = _field(request, "username")
+        # Checking a password takes tens of milliseconds, too long to hold up
+        # every other desk, so it runs off the event loop like borrowing does
+        session = await asyncio.to_thread(security.login, username, request.get("password"),
+                                          role, desk["source"])
+        if session is None:
+            if security.login_blocked(username, desk["source"]):
+                raise ClientError("too many login attempts")
+            raise ClientError("invalid credentials")
+        if desk["session"] is not None:
+            security.sessions.end(desk["session"].token)
+        desk["session"] = session
+        return {"username": session.username, "role": session.role}
+
+    if action == "logout":
+        if desk["session"] is None:
+            raise ClientError("not logged in")
+        # Not security.logout, which prints and flushes the logs for the console
+        security.sessions.end(desk["session"].token)
+        security.log_event(desk["session"].username, "Logged out")
+        desk["session"] = None
+        return None
+
+    if action not in ACTION_PERMISSIONS:
+        raise ClientError(f"unknown action {action!r}")
+    session = desk["session"]
+    # Looking the session up also counts as activity for its expiry time
+    if session is None or security.sessions.get(session.token) is None:
+        raise ClientError("not logged in")
+    if not security.has_access(ACTION_PERMISSIONS[action], session):
+        raise ClientError("access denied")
+
+    if action == "search":
+        limit = request.get("limit", SEARCH_LIMIT)
+        if not isinstance(limit, int) or limit < 0:
+            raise ClientError("limit must be a whole number")
+        keyword = request.get("keyword", "")
+        if not isinstance(keyword, str):
+            raise ClientError("keyword must be text")
+        found = operations.search_books(keyword, fuzzy=request.get("fuzzy") is True)
+        return [_book_result(isbn, book) for isbn, book in found[:limit]]
+
+    if action == "summary":
+        return operations.summary()
+
+    # Borrowing and returning save to disk, so run them off the event loop;
+    # the striped locks in operations.py keep them safe in other threads
+    isbn, member_id = _field(request, "isbn"), _field(request, "member_id")
+    change = operations.borrow_book if action == "borrow" else operations.return_book
+    if not await asyncio.to_thread(change, isbn, member_id):
+        raise ClientError(f"{action} failed")
+    return None
+
+
+async def _reply(line, desk):
+    """Returns the reply to one request line."""
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return {"ok": False, "error": "invalid JSON"}
+    if not isinstance(request, dict):
+        return {"ok": False, "error": "request must be a JSON object"}
+
+    reply = {"id": request.get("id")}
+    try:
+        reply["result"] = await handle_request(request, desk)
+        reply["ok"] = True
+    except ClientError as error:
+        reply.update(ok=False, error=str(error))
+    except Exception as error:
+        security.log_error(f"Server request failed: {error!r}")
+        reply.update(ok=False, error="internal error")
+    return reply
+
+
+async def handle_client(reader, writer):
+    """Serves one connection until the client disconnects."""
+    peer = writer.get_extra_info("peername")
+    desk = {"session": None, "source": peer[0] if peer else "unknown"}
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Longer than MAX_REQUEST_BYTES
+                break
+            if not line:
+                break
+            reply = await _reply(line, desk)
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        if desk["session"] is not None:
+            security.sessions.end(desk["session"].token)
+        writer.close()
+
+
+async def start_server(host=SERVER_HOST, port=SERVER_PORT):
+    """Starts listening and returns the asyncio server. Port 0 picks a free port."""
+    return await asyncio.start_server(handle_client, host, port, limit=MAX_REQUEST_BYTES)
+
+
+# ==============================
+# MAIN PROGRAM ENTRY
+# ==============================
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT):
+    """Runs the server until it is stopped with Ctrl+C."""
+    server = await start_server(host, port)
+    print(f"ReadEasy server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """Loads the saved library and serves it."""
+    security.set_log_mode("async")
+    operations.use_storage(storage.SQLiteStorage(storage.DATABASE_FILE))
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+
+if __name__ == "__main__":
+    main()
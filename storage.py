@@ -0,0 +1,537 @@
+# ================================================
+# ReadEasy Mini Library Management System
+#
+# PROG211 - Individual Assignment
+# Student: Joshua Mohamed Katibi Yaffa
+# ID: 905004075
+# Class: BSEM1101
+# Semester: 3
+# Year: 2
+#
+# Storage Module - Saving Library Data
+#
+# GitHub: JoshuaYaffa/SmartLibrary-Group-I
+# ================================================
+
+"""
+This module saves the library data so that it survives a restart.
+operations.py keeps working on its in-memory dictionaries and tells the
+active storage backend about every change it makes.
+
+Backends:
+    MemoryStorage  - saves nothing (the default when running the tests)
+    SQLiteStorage  - saves everything to an SQLite database file
+    JournalStorage - saves periodic snapshots plus a journal of every change
+"""
+
+import gc
+import glob
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+
+# Default database file used by the main program
+DATABASE_FILE = "library.db"
+
+
+# ==============================
+# In-Memory Backend
+# ==============================
+
+class MemoryStorage:
+    """
+    A backend that keeps nothing. It also shows the methods every backend
+    provides, each called by operations.py after a change succeeds.
+    """
+
+    def load(self):
+        """
+        Returns the saved data as three lists:
+        books   - (isbn, title, author, genre, total_copies, available_copies)
+        members - (member_id, name, email)
+        loans   - (isbn, member_id), in the order the books were borrowed
+        """
+        return [], [], []
+
+    def is_empty(self):
+        """Returns True if nothing has been saved yet."""
+        return True
+
+    def save_all(self, books, members):
+        """Saves a complete copy of the books and members dictionaries."""
+
+    def attach(self, books, members):
+        """Gives the backend the live books and members dictionaries."""
+
+    def add_book(self, isbn, book):
+        """Saves a new book."""
+
+    def add_books(self, items):
+        """Saves many new books, given as (isbn, book) pairs."""
+        for isbn, book in items:
+            self.add_book(isbn, book)
+
+    def update_book(self, isbn, book):
+        """Saves the changed details of a book."""
+
+    def delete_book(self, isbn):
+        """Removes a book and any loans of it."""
+
+    def add_member(self, member_id, member):
+        """Saves a new member."""
+
+    def add_members(self, items):
+        """Saves many new members, given as (member_id, member) pairs."""
+        for member_id, member in items:
+            self.add_member(member_id, member)
+
+    def update_member(self, member_id, member):
+        """Saves the changed details of a member."""
+
+    def delete_member(self, member_id):
+        """Removes a member and returns their loans to the shelf."""
+
+    def borrow(self, isbn, member_id):
+        """Saves a new loan."""
+
+    def borrow_many(self, pairs):
+        """Saves many new loans, given as (isbn, member_id) pairs."""
+        for isbn, member_id in pairs:
+            self.borrow(isbn, member_id)
+
+    def return_book(self, isbn, member_id):
+        """Removes a loan."""
+
+    def return_many(self, pairs):
+        """Removes many loans, given as (isbn, member_id) pairs."""
+        for isbn, member_id in pairs:
+            self.return_book(isbn, member_id)
+
+    def checkpoint_due(self):
+        """Returns True when the backend would like checkpoint() to be called."""
+        return False
+
+    def checkpoint(self):
+        """
+        Compacts the saved data. operations.py only calls this while no other
+        change is in progress, so the live dictionaries can be read safely.
+        """
+
+    def close(self):
+        """Releases any files held by the backend."""
+
+
+# ==============================
+# SQLite Backend
+# ==============================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    total_copies INTEGER NOT NULL,
+    available_copies INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS members (
+    member_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS loans (
+    loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isbn TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    UNIQUE (member_id, isbn)
+);
+CREATE INDEX IF NOT EXISTS books_title ON books (title);
+CREATE INDEX IF NOT EXISTS books_author ON books (author);
+CREATE INDEX IF NOT EXISTS loans_isbn ON loans (isbn);
+"""
+
+# The statements below always use the same SQL text with ? placeholders, so
+# sqlite3 prepares each of them once and reuses it from its statement cache.
+INSERT_BOOK = ("INSERT OR REPLACE INTO books (isbn, title, author, genre, total_copies, "
+               "available_copies) VALUES (?, ?, ?, ?, ?, ?)")
+DELETE_BOOK = "DELETE FROM books WHERE isbn = ?"
+DELETE_BOOK_LOANS = "DELETE FROM loans WHERE isbn = ?"
+INSERT_MEMBER = "INSERT OR REPLACE INTO members (member_id, name, email) VALUES (?, ?, ?)"
+DELETE_MEMBER = "DELETE FROM members WHERE member_id = ?"
+RELEASE_MEMBER_LOANS = ("UPDATE books SET available_copies = available_copies + 1 "
+                        "WHERE isbn IN (SELECT isbn FROM loans WHERE member_id = ?)")
+DELETE_MEMBER_LOANS = "DELETE FROM loans WHERE member_id = ?"
+INSERT_LOAN = "INSERT INTO loans (isbn, member_id) VALUES (?, ?)"
+DELETE_LOAN = "DELETE FROM loans WHERE isbn = ? AND member_id = ?"
+TAKE_COPY = "UPDATE books SET available_copies = available_copies - 1 WHERE isbn = ?"
+RETURN_COPY = "UPDATE books SET available_copies = available_copies + 1 WHERE isbn = ?"
+
+
+def book_row(isbn, book):
+    """Returns the database row for a book record."""
+    return (isbn, book.title, book.author, book.genre, book.total_copies, book.available_copies)
+
+
+class SQLiteStorage(MemoryStorage):
+    """
+    Saves the library to an SQLite database. The database runs in WAL mode
+    so that reading it never blocks a loan being written. The connection is
+    shared by all threads, so each transaction holds self.lock.
+    """
+
+    def __init__(self, path=DATABASE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, cached_statements=64, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def load(self):
+        with self.lock:
+            cursor = self.connection.cursor()
+            books = cursor.execute(
+                "SELECT isbn, title, author, genre, total_copies, available_copies FROM books"
+            ).fetchall()
+            members = cursor.execute("SELECT member_id, name, email FROM members").fetchall()
+            loans = cursor.execute("SELECT isbn, member_id FROM loans ORDER BY loan_id").fetchall()
+        return books, members, loans
+
+    def is_empty(self):
+        with self.lock:
+            cursor = self.connection.cursor()
+            return (cursor.execute("SELECT 1 FROM books LIMIT 1").fetchone() is None and
+                    cursor.execute("SELECT 1 FROM members LIMIT 1").fetchone() is None)
+
+    def save_all(self, books, members):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                INSERT_BOOK, (book_row(isbn, book) for isbn, book in books.items()))
+            self.connection.executemany(
+                INSERT_MEMBER,
+                ((member_id, member.name, member.email) for member_id, member in members.items()))
+            self.connection.executemany(
+                INSERT_LOAN,
+                ((isbn, member_id) for member_id, member in members.items()
+                 for isbn in member.borrowed_books))
+
+    def add_book(self, isbn, book):
+        with self.lock, self.connection:
+            self.connection.execute(INSERT_BOOK, book_row(isbn, book))
+
+    update_book = add_book
+
+    def add_books(self, items):
+        with self.lock, self.connection:
+            self.connection.executemany(INSERT_BOOK, (book_row(isbn, book) for isbn, book in items))
+
+    def delete_book(self, isbn):
+        with self.lock, self.connection:
+            self.connection.execute(DELETE_BOOK_LOANS, (isbn,))
+            self.connection.execute(DELETE_BOOK, (isbn,))
+
+    def add_member(self, member_id, member):
+        with self.lock, self.connection:
+            self.connection.execute(INSERT_MEMBER, (member_id, member.name, member.email))
+
+    update_member = add_member
+
+    def add_members(self, items):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                INSERT_MEMBER, ((member_id, member.name, member.email) for member_id, member in items))
+
+    def delete_member(self, member_id):
+        with self.lock, self.connection:
+            self.connection.execute(RELEASE_MEMBER_LOANS, (member_id,))
+            self.connection.execute(DELETE_MEMBER_LOANS, (member_id,))
+            self.connection.execute(DELETE_MEMBER, (member_id,))
+
+    def borrow(self, isbn, member_id):
+        with self.lock, self.connection:
+            self.connection.execute(TAKE_COPY, (isbn,))
+            self.connection.execute(INSERT_LOAN, (isbn, member_id))
+
+    def borrow_many(self, pairs):
+        with self.lock, self.connection:
+            self.connection.executemany(TAKE_COPY, ((isbn,) for isbn, _ in pairs))
+            self.connection.executemany(INSERT_LOAN, pairs)
+
+    def return_book(self, isbn, member_id):
+        with self.lock, self.connection:
+            self.connection.execute(RETURN_COPY, (isbn,))
+            self.connection.execute(DELETE_LOAN, (isbn, member_id))
+
+    def return_many(self, pairs):
+        with self.lock, self.connection:
+            self.connection.executemany(RETURN_COPY, ((isbn,) for isbn, _ in pairs))
+            self.connection.executemany(DELETE_LOAN, pairs)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# ==============================
+# Snapshot and Journal Backend
+# ==============================
+
+# Journal record codes
+(RECORD_ADD_BOOK, RECORD_DELETE_BOOK, RECORD_ADD_MEMBER,
+ RECORD_DELETE_MEMBER, RECORD_BORROW, RECORD_RETURN) = range(6)
+
+# Each journal record is a 4-byte length followed by a pickled tuple.
+# The protocol is fixed so files stay readable by other Python versions.
+RECORD_HEADER = struct.Struct("<I")
+PICKLE_PROTOCOL = 4
+
+
+def _change_available(row, change):
+    """Returns a copy of a book row with its available copies changed."""
+    return row[:5] + (row[5] + change,)
+
+
+class JournalStorage(MemoryStorage):
+    """
+    Saves the library as a snapshot of the full data plus a journal of the
+    changes made since. Every change appends one small binary record to the
+    journal; once the journal holds snapshot_every records a checkpoint is
+    due, and checkpoint() writes a new snapshot and starts a new, empty
+    journal. A lock keeps records from different threads whole.
+
+    Starting up only reads the latest snapshot and replays its journal, so
+    it does not depend on how long the library has been running.
+
+    Snapshots and journals are numbered. Snapshot N includes everything up to
+    the start of journal N, so a crash at any point during a snapshot leaves
+    a snapshot and journal pair that still agree.
+    """
+
+    def __init__(self, folder, snapshot_every=100000, sync=False):
+        self.folder = folder
+        self.snapshot_every = snapshot_every
+        self.sync = sync        # fsync after every record, not just flush
+        self.books = None       # Live dictionaries, given by attach()
+        self.members = None
+        os.makedirs(folder, exist_ok=True)
+        self.generation = self._latest_generation()
+        self.records = 0        # Records in the current journal
+        self.journal = None
+        self.lock = threading.RLock()
+
+    # ---------- file names ----------
+
+    def _snapshot_path(self, generation):
+        return os.path.join(self.folder, f"snapshot.{generation}.bin")
+
+    def _journal_path(self, generation):
+        return os.path.join(self.folder, f"journal.{generation}.bin")
+
+    def _latest_generation(self):
+        generations = [
+            int(os.path.basename(path).split(".")[1])
+            for path in glob.glob(os.path.join(self.folder, "snapshot.*.bin"))
+        ]
+        return max(generations, default=0)
+
+    # ---------- loading ----------
+
+    def load(self):
+        # Loading creates millions of small objects at once; pausing the
+        # garbage collector while doing so makes it several times faster.
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load()
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _load(self):
+        books, members, loans = {}, {}, {}
+        snapshot = self._snapshot_path(self.generation)
+        if os.path.exists(snapshot):
+            with open(snapshot, "rb") as snapshot_file:
+                book_rows, member_rows, loan_rows = pickle.loads(snapshot_file.read())
+            books = {row[0]: row for row in book_rows}
+            members = {row[0]: row for row in member_rows}
+            for isbn, member_id in loan_rows:
+                loans.setdefault(member_id, {})[isbn] = None
+
+        holders = {}
+        for member_id, isbns in loans.items():
+            for isbn in isbns:
+                holders.setdefault(isbn, set()).add(member_id)
+        self.records = self._replay(books, members, loans, holders)
+
+        loan_rows = [(isbn, member_id) for member_id, isbns in loans.items() for isbn in isbns]
+        return list(books.values()), list(members.values()), loan_rows
+
+    def _replay(self, books, members, loans, holders):
+        """
+        Applies the current journal to the loaded snapshot data, where books
+        and members map each key to its row. Returns the records replayed.
+        """
+        path = self._journal_path(self.generation)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as journal:
+            data = journal.read()
+
+        position = count = 0
+        while position + RECORD_HEADER.size <= len(data):
+            (length,) = RECORD_HEADER.unpack_from(data, position)
+            end = position + RECORD_HEADER.size + length
+            if end > len(data):
+                break
+            record = pickle.loads(data[position + RECORD_HEADER.size:end])
+            position = end
+            count += 1
+
+            code, key = record[0], record[1]
+            if code == RECORD_ADD_BOOK:
+                books[key] = record[1:]
+            elif code == RECORD_DELETE_BOOK:
+                books.pop(key, None)
+                for member_id in holders.pop(key, ()):
+                    loans[member_id].pop(key, None)
+            elif code == RECORD_ADD_MEMBER:
+                members[key] = record[1:]
+            elif code == RECORD_DELETE_MEMBER:
+                members.pop(key, None)
+                for isbn in loans.pop(key, ()):
+                    books[isbn] = _change_available(books[isbn], 1)
+                    holders[isbn].discard(key)
+            elif code == RECORD_BORROW:
+                books[key] = _change_available(books[key], -1)
+                loans.setdefault(record[2], {})[key] = None
+                holders.setdefault(key, set()).add(record[2])
+            elif code == RECORD_RETURN:
+                books[key] = _change_available(books[key], 1)
+                loans[record[2]].pop(key, None)
+                holders[key].discard(record[2])
+
+        if position < len(data):
+            # The last record was cut short by a crash; drop it
+            with open(path, "r+b") as journal:
+                journal.truncate(position)
+        return count
+
+    def is_empty(self):
+        return (not os.path.exists(self._snapshot_path(self.generation)) and
+                not os.path.exists(self._journal_path(self.generation)))
+
+    # ---------- writing ----------
+
+    def attach(self, books, members):
+        self.books = books
+        self.members = members
+
+    def save_all(self, books, members):
+        self.attach(books, members)
+        self.snapshot()
+
+    def checkpoint_due(self):
+        return self.records >= self.snapshot_every and self.books is not None
+
+    def checkpoint(self):
+        self.snapshot()
+
+    def snapshot(self):
+        """Writes a snapshot of the live data and starts a new journal."""
+        with self.lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        book_rows = [
+            (isbn, book.title, book.author, book.genre, book.total_copies, book.available_copies)
+            for isbn, book in self.books.items()
+        ]
+        member_rows = [(member_id, member.name, member.email)
+                       for member_id, member in self.members.items()]
+        loan_rows = [(isbn, member_id) for member_id, member in self.members.items()
+                     for isbn in member.borrowed_books]
+
+        generation = self.generation + 1
+        temporary = self._snapshot_path(generation) + ".tmp"
+        with open(temporary, "wb") as snapshot_file:
+            pickle.dump((book_rows, member_rows, loan_rows), snapshot_file, PICKLE_PROTOCOL)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary, self._snapshot_path(generation))
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        for old in (self._snapshot_path(self.generation), self._journal_path(self.generation)):
+            if os.path.exists(old):
+                os.remove(old)
+        self.generation = generation
+        self.records = 0
+
+    def _append(self, record):
+        self._append_many([record])
+
+    def _append_many(self, records):
+        """Writes several records to the journal with a single write."""
+        encoded = []
+        for record in records:
+            data = pickle.dumps(record, PICKLE_PROTOCOL)
+            encoded.append(RECORD_HEADER.pack(len(data)))
+            encoded.append(data)
+        with self.lock:
+            if self.journal is None:
+                self.journal = open(self._journal_path(self.generation), "ab")
+            self.journal.write(b"".join(encoded))
+            self.journal.flush()
+            if self.sync:
+                os.fsync(self.journal.fileno())
+            self.records += len(records)
+
+    def add_book(self, isbn, book):
+        self._append((RECORD_ADD_BOOK, isbn, book.title, book.author, book.genre,
+                      book.total_copies, book.available_copies))
+
+    update_book = add_book
+
+    def add_books(self, items):
+        self._append_many([
+            (RECORD_ADD_BOOK, isbn, book.title, book.author, book.genre,
+             book.total_copies, book.available_copies)
+            for isbn, book in items
+        ])
+
+    def delete_book(self, isbn):
+        self._append((RECORD_DELETE_BOOK, isbn))
+
+    def add_member(self, member_id, member):
+        self._append((RECORD_ADD_MEMBER, member_id, member.name, member.email))
+
+    update_member = add_member
+
+    def add_members(self, items):
+        self._append_many([(RECORD_ADD_MEMBER, member_id, member.name, member.email)
+                           for member_id, member in items])
+
+    def delete_member(self, member_id):
+        self._append((RECORD_DELETE_MEMBER, member_id))
+
+    def borrow(self, isbn, member_id):
+        self._append((RECORD_BORROW, isbn, member_id))
+
+    def borrow_many(self, pairs):
+        self._append_many([(RECORD_BORROW, isbn, member_id) for isbn, member_id in pairs])
+
+    def return_book(self, isbn, member_id):
+        self._append((RECORD_RETURN, isbn, member_id))
+
+    def return_many(self, pairs):
+        self._append_many([(RECORD_RETURN, isbn, member_id) for isbn, member_id in pairs])
+
+    def close(self):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
@@ -20,9 +20,22 @@ and some essential checks from security.py to ensure that the system
 works correctly and consistently.
 """
 
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
 import unittest
+from unittest import mock
+import benchmarks
+import metrics
 import operations
+import profiling
 import security
+import server
+import storage
 
 
 # ==============================================
@@ -62,6 +75,106 @@ class TestLibraryOperations(unittest.TestCase):
         self.assertTrue(result)
         self.assertNotIn("7777777777777", self.books)
 
+    def test_book_record_fields(self):
+        """Test that book records work as attributes and as keys."""
+        book = self.books["92"]
+        self.assertIsInstance(book, operations.Book)
+        self.assertEqual(book.title, book["title"])
+        with self.assertRaises(AttributeError):
+            book.publisher = "Penguin"
+        with self.assertRaises(KeyError):
+            book["publisher"]
+
+    def test_search_books(self):
+        """Test searching by word prefix with title matches ranked first."""
+        operations.add_book("6666666666666", "Rowling Biography", "Someone", "Fantasy", 1)
+        results = [isbn for isbn, _ in operations.search_books("rowl")]
+        self.assertEqual(results[0], "6666666666666")
+        self.assertIn("91", results)
+        self.assertIn("100", results)
+        self.assertEqual(operations.search_books("gatsby")[0][0], "95")
+        self.assertEqual(operations.search_books("no such book"), [])
+        operations.delete_book("6666666666666")
+
+    def test_search_any_script(self):
+        """Test that non-Latin titles are searchable and punctuation alone matches nothing."""
+        operations.add_book("6666666666667", "Война и мир", "Лев Толстой", "Classic", 1)
+        self.assertEqual([isbn for isbn, _ in operations.search_books("Война")], ["6666666666667"])
+        self.assertEqual([isbn for isbn, _ in operations.search_books("толст")], ["6666666666667"])
+        self.assertEqual(operations.search_books("!!!"), [])
+        self.assertEqual(len(operations.search_books("  ")), len(self.books))
+        operations.delete_book("6666666666667")
+
+    def test_search_index_follows_updates(self):
+        """Test that updated and deleted books are reflected in search."""
+        operations.add_book("5555555555555", "Indexed Title", "Author", "Genre", 1)
+        operations.update_book("5555555555555", title="Renamed Volume")
+        self.assertEqual(operations.search_books("indexed"), [])
+        self.assertEqual(operations.search_books("renamed")[0][0], "5555555555555")
+        operations.delete_book("5555555555555")
+        self.assertEqual(operations.search_books("renamed"), [])
+
+    def test_fuzzy_search(self):
+        """Test that fuzzy search forgives typos and follows catalog changes."""
+        self.assertEqual(operations.search_books("Gatsbi"), [])
+        self.assertEqual(operations.search_books("Gatsbi", fuzzy=True)[0][0], "95")
+        results = [isbn for isbn, _ in operations.search_books("harry poter", fuzzy=True)]
+        self.assertIn("91", results)
+        self.assertIn("100", results)
+        self.assertEqual(operations.search_books("xq", fuzzy=True), [])
+        self.assertEqual(operations._edit_distance("rowlng", "rowling", 1), 1)
+        self.assertEqual(operations._edit_distance("kitten", "sitting", 1), 2)
+
+        operations.add_book("8888888888888", "Quixotic Adventures", "Somebody", "Fiction", 1)
+        self.assertEqual(operations.search_books("quixotik", fuzzy=True)[0][0], "8888888888888")
+        operations.update_book("8888888888888", title="Plain Adventures")
+        self.assertEqual(operations.search_books("quixotik", fuzzy=True), [])
+        operations.delete_book("8888888888888")
+        self.assertNotIn("quixotic", operations.fuzzy_words)
+        self.assertNotIn("plain", operations.fuzzy_words)
+
+        # Words with repeated trigrams are still found
+        operations.add_book("8888888888888", "Aaaaa Laaaab", "Lnnnnnb", "Fiction", 1)
+        self.assertIn("aaaaa", operations._similar_words("aaaab"))
+        self.assertIn("laaaab", operations._similar_words("aaaab"))
+        self.assertIn("lnnnnnb", operations._similar_words("annnnns"))
+        operations.delete_book("8888888888888")
+
+    def test_search_cache(self):
+        """Test that repeated searches are cached and only affected ones are dropped."""
+        operations.clear_search_cache()
+        before = operations.search_cache_stats()
+        first = operations.search_books("Harry potter")
+        self.assertEqual(operations.search_books("potter harry"), first)
+        operations.search_books("gatsby")
+        stats = operations.search_cache_stats()
+        self.assertEqual(stats["hits"] - before["hits"], 1)
+        self.assertEqual(stats["size"], 2)
+
+        # A new Potter book drops the Potter search but not the Gatsby one
+        operations.add_book("7777777777777", "Harry Potter Companion", "Someone", "Fantasy", 1)
+        self.assertEqual(operations.search_cache_stats()["size"], 1)
+        self.assertIn("7777777777777", [isbn for isbn, _ in operations.search_books("harry potter")])
+        operations.update_book("7777777777777", total_copies=2)
+        self.assertEqual(operations.search_cache_stats()["size"], 2)
+        operations.delete_book("7777777777777")
+        self.assertNotIn("7777777777777", [isbn for isbn, _ in operations.search_books("harry potter")])
+
+        # Old entries expire
+        hits = operations.search_cache_stats()["hits"]
+        with mock.patch("operations.time.monotonic", return_value=operations.time.monotonic() + 3600):
+            operations.search_books("gatsby")
+        self.assertEqual(operations.search_cache_stats()["hits"], hits)
+
+        # A search that overlapped a change does not store its result, even
+        # when nothing was cached at the time
+        operations.clear_search_cache()
+        _, version = operations._cached_search(("zebra",))
+        operations.add_book("7777777777777", "Zebra Tales", "Someone", "Fiction", 1)
+        operations._cache_search(("zebra",), [], version)
+        self.assertEqual(operations.search_books("zebra")[0][0], "7777777777777")
+        operations.delete_book("7777777777777")
+
     # ------------------------------
     # Test Member Management
     # ------------------------------
@@ -102,6 +215,209 @@ class TestLibraryOperations(unittest.TestCase):
         self.assertTrue(result_return)
         self.assertNotIn(isbn, operations.members[member_id]["borrowed_books"])
 
+    def test_loans_keep_borrow_order(self):
+        """Test that a member's loans are listed in the order borrowed."""
+        operations.add_member("M444", "Loan Order", "order@example.com")
+        for isbn in ("93", "91", "92"):
+            operations.borrow_book(isbn, "M444")
+        operations.return_book("91", "M444")
+        self.assertEqual(list(self.members["M444"]["borrowed_books"]), ["93", "92"])
+        self.assertFalse(operations.return_book("91", "M444"))
+        operations.delete_member("M444")
+
+    def test_borrowers_index(self):
+        """Test the ISBN to borrowers index and cleanup on delete."""
+        operations.add_book("4444444444444", "Recall Book", "Author", "Genre", 3)
+        operations.add_member("M666", "Borrower One", "one@example.com")
+        operations.add_member("M555", "Borrower Two", "two@example.com")
+        operations.borrow_book("4444444444444", "M666")
+        operations.borrow_book("4444444444444", "M555")
+        self.assertEqual(operations.get_borrowers("4444444444444"), ["M555", "M666"])
+
+        operations.delete_member("M555")
+        self.assertEqual(operations.get_borrowers("4444444444444"), ["M666"])
+        self.assertEqual(self.books["4444444444444"]["available_copies"], 2)
+
+        operations.delete_book("4444444444444")
+        self.assertEqual(operations.get_borrowers("4444444444444"), [])
+        self.assertNotIn("4444444444444", self.members["M666"]["borrowed_books"])
+        operations.delete_member("M666")
+
+    def test_borrow_books_batch(self):
+        """Test a batch checkout with per-item result codes and one audit record."""
+        operations.add_book("0000000000001", "Class Set", "Author", "Genre", 2)
+        operations.add_member("M101", "Pupil One", "p1@example.com")
+        operations.add_member("M102", "Pupil Two", "p2@example.com")
+        operations.add_member("M103", "Pupil Three", "p3@example.com")
+        batch = [("0000000000001", "M101"), ("0000000000001", "M102"),
+                 ("0000000000001", "M103"), ("0000000000001", "M101"), ("404", "M101")]
+        with mock.patch.object(security, "log_event") as log_event:
+            results = operations.borrow_books(batch, username="staff")
+        self.assertEqual(results, [operations.OK, operations.OK, operations.NO_COPIES_LEFT,
+                                   operations.ALREADY_BORROWED, operations.NO_SUCH_BOOK])
+        log_event.assert_called_once()
+        self.assertEqual(operations.get_borrowers("0000000000001"), ["M101", "M102"])
+
+        returns = [("0000000000001", "M101"), ("0000000000001", "M103")]
+        self.assertEqual(operations.return_books(returns, atomic=True),
+                         [operations.NOT_APPLIED, operations.NOT_BORROWED])
+        self.assertEqual(operations.get_borrowers("0000000000001"), ["M101", "M102"])
+        self.assertEqual(operations.return_books(returns[:1], atomic=True), [operations.OK])
+        self.assertEqual(operations.get_borrowers("0000000000001"), ["M102"])
+
+        for member_id in ("M101", "M102", "M103"):
+            operations.delete_member(member_id)
+        operations.delete_book("0000000000001")
+
+    def test_new_book_cannot_be_lent_before_it_is_saved(self):
+        """Test that a loan of a book being added waits until the book is saved and counted."""
+        saved = []
+        real_add, real_borrow = operations.store.add_book, operations.store.borrow
+        lender = threading.Thread(target=operations.borrow_book, args=("R1", "M001"))
+
+        def slow_add(isbn, book):
+            # If the book were already visible, the loan would happen right here
+            lender.start()
+            lender.join(0.2)
+            saved.append("add")
+            real_add(isbn, book)
+
+        def record_borrow(isbn, member_id):
+            saved.append("borrow")
+            real_borrow(isbn, member_id)
+
+        with mock.patch.object(operations.store, "add_book", slow_add), \
+                mock.patch.object(operations.store, "borrow", record_borrow):
+            operations.add_book("R1", "Race Condition", "Author", "Genre", 1)
+            lender.join()
+        self.assertEqual(saved, ["add", "borrow"])
+        self.assertEqual(operations.summary()["available_copies"],
+                         sum(book.available_copies for book in self.books.values()))
+        operations.return_book("R1", "M001")
+        operations.delete_book("R1")
+
+    def test_concurrent_borrow_and_return(self):
+        """Test that desks borrowing and returning at once never oversell a book."""
+        isbns = [f"T-{n:03d}" for n in range(8)]
+        member_ids = [f"T{n:03d}" for n in range(40)]
+        for isbn in isbns:
+            operations.add_book(isbn, "Threaded Copy", "Author", "Genre", 3)
+        for member_id in member_ids:
+            operations.add_member(member_id, "Threaded Member", "thread@example.com")
+        before = operations.summary()
+
+        def desk(number):
+            for round_number in range(2000):
+                isbn = isbns[(number + round_number) % len(isbns)]
+                member_id = member_ids[(number * 7 + round_number) % len(member_ids)]
+                if not operations.borrow_book(isbn, member_id):
+                    operations.return_book(isbn, member_id)
+                if round_number % 50 == 0:
+                    operations.borrow_books([(isbns[0], member_id), (isbns[-1], member_id)])
+
+        # Switch threads very often so that any missing lock shows up
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            desks = [threading.Thread(target=desk, args=(number,)) for number in range(8)]
+            for thread in desks:
+                thread.start()
+            for thread in desks:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        for isbn in isbns:
+            book = self.books[isbn]
+            holders = operations.get_borrowers(isbn)
+            self.assertGreaterEqual(book.available_copies, 0)
+            self.assertEqual(book.available_copies + len(holders), book.total_copies)
+            for member_id in holders:
+                self.assertIn(isbn, self.members[member_id].borrowed_books)
+        loans = sum(len(operations.get_borrowers(isbn)) for isbn in isbns)
+        totals = operations.summary()
+        self.assertEqual(totals["borrowed_books"], before["borrowed_books"] + loans)
+        self.assertEqual(totals["available_copies"], before["available_copies"] - loans)
+
+        for member_id in member_ids:
+            operations.delete_member(member_id)
+        for isbn in isbns:
+            operations.delete_book(isbn)
+
+    # ------------------------------
+    # Test Bulk Import
+    # ------------------------------
+
+    def test_bulk_add_books_csv(self):
+        """Test importing a CSV catalog with bad rows reported, not fatal."""
+        catalog = io.StringIO(
+            "isbn,title,author,genre,total_copies\n"
+            "B-001,Bulk Loaded Atlas,Mapmaker,Reference,2\n"
+            "B-002,,Nobody,Reference,1\n"
+            "B-003,Bulk Loaded Almanac,Mapmaker,Reference,many\n"
+            "91,Duplicate Potter,Someone,Fantasy,1\n"
+            "B-004,Bulk Loaded Gazetteer,Mapmaker,Reference,3\n"
+        )
+        before = operations.summary()
+        report = operations.bulk_add_books(catalog)
+        self.assertEqual(report["added"], 2)
+        self.assertEqual(report["rejected"], [(3, "missing title"), (4, "invalid total_copies"),
+                                              (5, "duplicate ISBN 91")])
+        self.assertEqual([isbn for isbn, _ in operations.search_books("bulk loaded")], ["B-001", "B-004"])
+        self.assertEqual(operations.summary()["total_copies"], before["total_copies"] + 5)
+        self.assertEqual(operations.summary()["genres"]["Reference"], 2)
+        operations.delete_book("B-001")
+        operations.delete_book("B-004")
+
+    def test_bulk_add_books_bad_values(self):
+        """Test that wrongly typed JSON values are rejected and saved rows stay searchable."""
+        catalog = [
+            '{"isbn": "J1", "title": "Good Row", "author": "Writer", "genre": "Drama", "total_copies": 2.0}\n',
+            '{"isbn": "J2", "title": 123, "author": "Writer", "genre": "Drama", "total_copies": 1}\n',
+            '{"isbn": "J3", "title": "Third Row", "author": "Writer", "genre": "Drama", "total_copies": 2.9}\n',
+            '{"isbn": "J4", "title": "Fourth Row", "author": "Writer", "genre": "Drama", "total_copies": true}\n',
+        ]
+        report = operations.bulk_add_books(catalog, fmt="jsonl")
+        self.assertEqual(report["added"], 1)
+        self.assertEqual(report["rejected"], [(2, "invalid title"), (3, "invalid total_copies"),
+                                              (4, "invalid total_copies")])
+        self.assertEqual(self.books["J1"].total_copies, 2)
+        self.assertEqual(operations.search_books("good row")[0][0], "J1")
+
+        def broken_source():
+            yield '{"isbn": "J5", "title": "Before Failure", "author": "Writer", "genre": "Drama", "total_copies": 1}\n'
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        with self.assertRaises(UnicodeDecodeError):
+            operations.bulk_add_books(broken_source(), fmt="jsonl", chunk_size=1)
+        self.assertEqual(operations.search_books("before failure")[0][0], "J5")
+        operations.delete_book("J1")
+        operations.delete_book("J5")
+
+    def test_bulk_add_members_jsonl(self):
+        """Test importing a JSON Lines member roster."""
+        roster = [
+            '{"member_id": "J001", "name": "Json Member", "email": "json@example.com"}\n',
+            'not json\n',
+            '{"member_id": "J001", "name": "Repeat", "email": "repeat@example.com"}\n',
+        ]
+        report = operations.bulk_add_members(roster, fmt="jsonl", chunk_size=1)
+        self.assertEqual(report["added"], 1)
+        self.assertEqual(report["rejected"], [(2, "unreadable row"), (3, "duplicate member ID J001")])
+        self.assertEqual(self.members["J001"].name, "Json Member")
+        operations.delete_member("J001")
+
+    def test_benchmark_suite_restores_library(self):
+        """Test that a small benchmark run leaves the real library as it was and spots regressions."""
+        before = (operations.summary(), benchmarks.library_rows())
+        report = benchmarks.run_suite(200, 50, searches=20, loans=200, log_events=200)
+        self.assertEqual((operations.summary(), benchmarks.library_rows()), before)
+        self.assertIn("borrow_book", report["results"])
+
+        slower = {"results": {"borrow_book": {"us_per_op": report["results"]["borrow_book"]["us_per_op"] / 2}}}
+        self.assertEqual([name for name, _, _ in benchmarks.find_regressions(report, slower)], ["borrow_book"])
+        self.assertEqual(benchmarks.find_regressions(report, report), [])
+
     # ------------------------------
     # Test Preloaded Data
     # ------------------------------
@@ -125,6 +441,206 @@ class TestLibraryOperations(unittest.TestCase):
         except Exception as e:
             self.fail(f"System summary raised an exception: {e}")
 
+    def test_summary_matches_data(self):
+        """Test that the running totals agree with a full recount."""
+        operations.add_book("3333333333333", "Counted", "Author", "Counting", 4)
+        operations.add_member("M333", "Counter", "count@example.com")
+        operations.borrow_book("3333333333333", "M333")
+        operations.borrow_book("92", "M333")
+        operations.update_book("3333333333333", genre="Recounting", total_copies=6)
+        operations.delete_book("3333333333333")
+
+        totals = operations.summary()
+        self.assertEqual(totals["total_books"], len(self.books))
+        self.assertEqual(totals["total_copies"],
+                         sum(book.total_copies for book in self.books.values()))
+        self.assertEqual(totals["available_copies"],
+                         sum(book.available_copies for book in self.books.values()))
+        self.assertEqual(totals["borrowed_books"],
+                         sum(len(member.borrowed_books) for member in self.members.values()))
+        self.assertNotIn("Recounting", totals["genres"])
+        operations.delete_member("M333")
+        self.assertEqual(operations.summary()["available_copies"],
+                         sum(book.available_copies for book in self.books.values()))
+
+
+# ==============================================
+# Test Class for Metrics and Profiling
+# ==============================================
+
+class TestMetrics(unittest.TestCase):
+    """Checks the metrics registry and the session profiler."""
+
+    def tearDown(self):
+        metrics.enable()
+        for name in ("test.halve", "test.block"):
+            metrics.registry.pop(name, None)
+
+    def test_timed_functions_and_blocks(self):
+        """Test that calls, errors and timings are recorded and can be switched off."""
+        @metrics.timed("test.halve")
+        def halve(value):
+            if value < 0:
+                raise ValueError("negative")
+            return value / 2
+
+        operations.borrow_book("404", "nobody")
+        self.assertEqual(halve(8), 4)
+        halve(2)
+        with self.assertRaises(ValueError):
+            halve(-1)
+        with metrics.timer("test.block"):
+            halve(4)
+        metrics.disable()
+        halve(6)
+        with metrics.timer("test.block"):
+            pass
+
+        values = metrics.snapshot()
+        self.assertEqual((values["test.halve"]["calls"], values["test.halve"]["errors"]), (4, 1))
+        self.assertEqual(values["test.block"]["calls"], 1)
+        self.assertEqual(sum(values["test.halve"]["histogram"].values()), 4)
+        self.assertLessEqual(values["test.halve"]["p50_us"], values["test.halve"]["max_us"])
+        self.assertIn("operations.borrow_book", json.loads(metrics.report_json())["metrics"])
+        self.assertIn("test.halve", metrics.report_text())
+
+    def test_session_profiler_report(self):
+        """Test that a profiled session writes per-action timings and a .prof file."""
+        profiler = profiling.SessionProfiler()
+        profiler.start()
+        for _ in range(2):
+            profiler.start_action("3. Borrow Book")
+            operations.search_books("harry potter")
+        profiler.start_action("11. System Summary")
+        operations.summary()
+        with tempfile.TemporaryDirectory() as folder:
+            path = profiler.write_report("staff", folder)
+            with open(path, encoding="utf-8") as report_file:
+                report = report_file.read()
+            self.assertTrue(os.path.exists(path[:-len(".txt")] + ".prof"))
+        self.assertEqual(profiler.actions["3. Borrow Book"][0], 2)
+        self.assertEqual(profiler.actions["11. System Summary"][0], 1)
+        self.assertIn("3. Borrow Book", report)
+        self.assertIn("search_books", report)
+
+
+# ==============================================
+# Test Class for Saved Data
+# ==============================================
+
+class TestStorage(unittest.TestCase):
+    """Checks that changes are saved to SQLite and can be loaded again."""
+
+    def test_sqlite_storage_round_trip(self):
+        """Test that books, members and loans survive a reload."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "library.db")
+            operations.use_storage(storage.SQLiteStorage(path))
+            try:
+                operations.add_book("2222222222222", "Saved Book", "Author", "Genre", 2)
+                operations.add_member("M222", "Saved Member", "saved@example.com")
+                operations.borrow_book("2222222222222", "M222")
+                operations.borrow_book("92", "M222")
+                operations.return_book("2222222222222", "M222")
+                operations.update_book("2222222222222", title="Saved Again")
+                expected_summary = operations.summary()
+
+                reopened = storage.SQLiteStorage(path)
+                operations.load_state(*reopened.load())
+                reopened.close()
+                self.assertEqual(operations.books["2222222222222"].title, "Saved Again")
+                self.assertEqual(list(operations.members["M222"].borrowed_books), ["92"])
+                self.assertEqual(operations.get_borrowers("92"), ["M222"])
+                self.assertEqual(operations.summary(), expected_summary)
+                self.assertEqual(operations.search_books("saved again")[0][0], "2222222222222")
+
+                operations.delete_member("M222")
+                operations.delete_book("2222222222222")
+            finally:
+                operations.use_storage(storage.MemoryStorage())
+
+    def test_journal_storage_recovery(self):
+        """Test that a snapshot plus journal replay restores the same state."""
+        with tempfile.TemporaryDirectory() as folder:
+            operations.use_storage(storage.JournalStorage(folder, snapshot_every=4))
+            try:
+                operations.add_book("1111111111111", "Journaled", "Author", "Genre", 3)
+                operations.add_member("M111", "Journal Member", "journal@example.com")
+                operations.add_member("M112", "Second Member", "second@example.com")
+                operations.borrow_book("1111111111111", "M111")
+                operations.borrow_book("1111111111111", "M112")
+                operations.borrow_book("93", "M112")
+                operations.delete_member("M111")
+                expected_summary = operations.summary()
+                operations.store.close()
+
+                # Simulate a crash in the middle of writing a record
+                recovered = storage.JournalStorage(folder)
+                with open(recovered._journal_path(recovered.generation), "ab") as journal:
+                    journal.write(b"\x40\x00\x00\x00partial")
+
+                operations.load_state(*recovered.load())
+                self.assertEqual(operations.summary(), expected_summary)
+                self.assertEqual(list(operations.members["M112"].borrowed_books), ["1111111111111", "93"])
+                self.assertEqual(operations.books["1111111111111"].available_copies, 2)
+                self.assertNotIn("M111", operations.members)
+                self.assertEqual(recovered.records, 3)
+
+                operations.delete_member("M112")
+                operations.delete_book("1111111111111")
+            finally:
+                operations.use_storage(storage.MemoryStorage())
+
+
+# ==============================================
+# Test Class for the Network Server
+# ==============================================
+
+class TestServer(unittest.TestCase):
+    """Checks the JSON lines server over a real connection."""
+
+    def test_server_requests(self):
+        """Test login, role checks, search and circulation over the network."""
+        async def conversation():
+            local = await server.start_server(port=0)
+            port = local.sockets[0].getsockname()[1]
+            async with local:
+                reader, writer = await asyncio.open_connection(server.SERVER_HOST, port)
+
+                async def call(**request):
+                    writer.write(json.dumps(request).encode("utf-8") + b"\n")
+                    await writer.drain()
+                    return json.loads(await reader.readline())
+
+                replies = [
+                    await call(action="search", keyword="dune"),
+                    await call(action="login", username="Reader", role="member"),
+                    await call(action="summary"),
+                    await call(id=7, action="search", keyword="dune"),
+                    await call(action="borrow", isbn="97", member_id="M004"),
+                    await call(action="return", isbn="97", member_id="M004"),
+                    await call(action="return", isbn="97", member_id="M004"),
+                    await call(action="dance"),
+                    await call(action="search", keyword=5),
+                ]
+                writer.write(b"not json\n")
+                replies.append(json.loads(await reader.readline()))
+                writer.close()
+                await writer.wait_closed()
+            return replies
+
+        with mock.patch("builtins.print"):
+            replies = asyncio.run(conversation())
+        self.assertEqual(replies[0], {"id": None, "ok": False, "error": "not logged in"})
+        self.assertTrue(replies[1]["ok"])
+        self.assertEqual(replies[2]["error"], "access denied")
+        self.assertEqual(replies[3]["id"], 7)
+        self.assertEqual(replies[3]["result"][0]["title"], "Dune")
+        self.assertEqual([reply["ok"] for reply in replies[4:]], [True, True, False, False, False, False])
+        self.assertEqual(replies[8]["error"], "keyword must be text")
+        self.assertEqual(replies[9]["error"], "invalid JSON")
+        self.assertEqual(operations.books["97"].available_copies, 12)
+
 
 # ==============================================
 # Test Class for Security Features
@@ -141,6 +657,119 @@ class TestSecurityModule(unittest.TestCase):
         self.assertEqual(users["admin"]["role"], "admin")
         self.assertEqual(users["staff"]["role"], "staff")
 
+    def test_login_sessions(self):
+        """Test that several desks can be logged in at once with their own access."""
+        admin = security.login("admin", "admin123", "admin")
+        staff = security.login("staff", "staff123", "staff")
+        member = security.login("Reader")
+        self.assertIsNone(security.login("staff", "wrong", "staff"))
+        self.assertIsNone(security.login("staff", "staff123", "admin"))
+        self.assertEqual(staff["username"], "staff")
+
+        with mock.patch("builtins.print") as printed:
+            self.assertTrue(security.has_access("staff", admin))
+            self.assertTrue(security.has_access("staff", staff))
+            self.assertFalse(security.has_access("admin", staff))
+            self.assertFalse(security.has_access("staff", member))
+            self.assertFalse(security.has_access("member"))
+            self.assertTrue(security.has_access("view_logs", admin))
+            self.assertTrue(security.has_access("view_summary", staff))
+            self.assertFalse(security.has_access("manage_books", staff))
+            self.assertTrue(security.has_access("borrow", member))
+            self.assertFalse(security.has_access("view_members", member))
+            printed.assert_not_called()
+            security.logout(staff)
+            self.assertFalse(security.has_access("staff", staff))
+            self.assertTrue(security.has_access("admin", admin))
+            security.logout(admin)
+            security.logout(member)
+
+    def test_password_hashing_and_login_cache(self):
+        """Test salted hashes and that repeat logins skip the slow check."""
+        fast = ("pbkdf2_sha256", (1000,))
+        first = security.hash_password("secret", *fast)
+        self.assertNotEqual(first, security.hash_password("secret", *fast))
+        self.assertNotIn("secret", first)
+        self.assertTrue(security.verify_password("secret", first))
+        self.assertFalse(security.verify_password("Secret", first))
+        self.assertFalse(security.verify_password("secret", "garbage"))
+        self.assertFalse(security.verify_password("secret", first[:-1] + "z"))
+        with mock.patch.object(security.hashlib, "scrypt", side_effect=AttributeError, create=True):
+            self.assertFalse(security.verify_password("admin123", security.USERS["admin"]["password_hash"]))
+        for user in security.USERS.values():
+            self.assertNotIn("password", user)
+
+        cache = security.LoginCache(seconds=60)
+        with mock.patch.object(security, "verify_password", wraps=security.verify_password) as verify:
+            self.assertTrue(cache.check("clerk", "secret", first))
+            self.assertTrue(cache.check("clerk", "secret", first))
+            self.assertFalse(cache.check("clerk", "wrong", first))
+            self.assertEqual(verify.call_count, 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_login_rate_limiter(self):
+        """Test token buckets, lockouts and eviction of idle buckets."""
+        limiter = security.RateLimiter(burst=2, refill_seconds=10, lockout_failures=3,
+                                       lockout_seconds=60, max_keys=2)
+        with mock.patch.object(security.time, "monotonic", return_value=1000.0) as clock:
+            self.assertEqual([limiter.allow("desk"), limiter.allow("desk"), limiter.allow("desk")],
+                             [True, True, False])
+            clock.return_value = 1010.0
+            self.assertTrue(limiter.allow("desk"))
+            self.assertFalse(limiter.allow("desk"))
+
+            for _ in range(3):
+                limiter.failed("clerk")
+            self.assertTrue(limiter.blocked("clerk"))
+            self.assertFalse(limiter.allow("clerk"))
+            clock.return_value = 1071.0
+            self.assertTrue(limiter.allow("clerk"))
+
+            limiter.allow("kiosk")
+            self.assertEqual(len(limiter), 2)
+            self.assertFalse(limiter.blocked("desk"))
+
+    def test_login_throttling(self):
+        """Test that a login loop is refused before the password check and logged once."""
+        limiter = security.RateLimiter(burst=2, refill_seconds=60)
+        with mock.patch.object(security, "user_limiter", limiter), \
+                mock.patch.object(security, "log_event") as log_event, \
+                mock.patch.object(security.login_cache, "check", return_value=False) as check:
+            for _ in range(5):
+                self.assertIsNone(security.login("staff", "guess", "staff", source="script"))
+            self.assertEqual(check.call_count, 2)
+            self.assertTrue(security.login_blocked("staff", "script"))
+            log_event.assert_called_once_with("staff", "Login attempts throttled from script")
+
+    def test_correct_logins_are_not_throttled(self):
+        """Test that many desks logging in as the same user at once are all let in."""
+        limiter = security.RateLimiter(burst=2, refill_seconds=60)
+        with mock.patch.object(security, "user_limiter", limiter), \
+                mock.patch.object(security.login_cache, "check", return_value=True):
+            sessions = [security.login("staff", "staff123", "staff", source=f"desk{n}") for n in range(6)]
+        self.assertNotIn(None, sessions)
+        for session in sessions:
+            security.sessions.end(session.token)
+
+    def test_session_expiry_and_eviction(self):
+        """Test that idle sessions expire and the oldest are evicted when full."""
+        table = security.SessionTable(timeout=60, max_sessions=2)
+        with mock.patch.object(security.time, "monotonic", return_value=1000.0) as clock:
+            first = table.create("first", "staff")
+            second = table.create("second", "staff")
+            clock.return_value = 1030.0
+            self.assertIs(table.get(first.token), first)
+            third = table.create("third", "staff")
+            self.assertIsNone(table.get(second.token))
+            self.assertEqual(len(table), 2)
+
+            clock.return_value = 1040.0
+            self.assertIs(table.get(third.token), third)
+            clock.return_value = 1095.0
+            self.assertEqual(table.expire(), 1)
+            self.assertIsNone(table.get(first.token))
+            self.assertIs(table.get(third.token), third)
+
     def test_log_event_function(self):
         """Test audit log function works properly."""
         try:
@@ -155,6 +784,210 @@ class TestSecurityModule(unittest.TestCase):
         except Exception as e:
             self.fail(f"log_error() raised an exception: {e}")
 
+    def test_buffered_log_writer(self):
+        """Test that buffered records reach the file once flushed."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "log.txt")
+            writer = security.LogWriter(path)
+            writer.write("first\n")
+            self.assertFalse(os.path.exists(path))
+            writer.flush()
+            with open(path, encoding="utf-8") as log_file:
+                self.assertEqual(log_file.read(), "first\n")
+
+            # A lone record is still written once it is LOG_FLUSH_INTERVAL old
+            with mock.patch("security.LOG_FLUSH_INTERVAL", 0.05):
+                writer.write("second\n")
+                timer = writer.timer
+                if timer is not None:
+                    timer.join()
+            with open(path, encoding="utf-8") as log_file:
+                self.assertEqual(log_file.read(), "first\nsecond\n")
+
+    def test_sync_log_mode(self):
+        """Test that sync mode writes each record straight away."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "log.txt")
+            writer = security.LogWriter(path)
+            security.set_log_mode("sync")
+            try:
+                writer.write("durable\n")
+                with open(path, encoding="utf-8") as log_file:
+                    self.assertEqual(log_file.read(), "durable\n")
+            finally:
+                security.set_log_mode("buffered")
+        with self.assertRaises(ValueError):
+            security.set_log_mode("sometimes")
+
+    def test_async_log_mode(self):
+        """Test that queued records are written once the queue is drained."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "log.txt")
+            writer = security.LogWriter(path)
+            security.set_log_mode("async")
+            try:
+                for n in range(250):
+                    writer.write(f"record {n}\n")
+                security.flush_logs()
+                with open(path, encoding="utf-8") as log_file:
+                    self.assertEqual(len(log_file.readlines()), 250)
+            finally:
+                security.set_log_mode("buffered")
+
+    def test_log_rotation(self):
+        """Test that full or old log files are archived and still readable."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "audit.txt")
+            writer = security.LogWriter(path)
+            writer.write("[2025-10-16 09:00:00] USER: a - ACTION: first\n")
+            writer.flush()
+
+            # A new day starts a new segment
+            writer.day = writer.day - security.datetime.timedelta(days=1)
+            writer.write("[2025-10-17 09:00:00] USER: a - ACTION: second\n")
+            writer.flush()
+
+            # So does a live file that has grown past the size limit
+            limit = security.LOG_MAX_BYTES
+            security.LOG_MAX_BYTES = 10
+            try:
+                writer.write("[2025-10-17 10:00:00] USER: a - ACTION: third\n")
+                writer.flush()
+            finally:
+                security.LOG_MAX_BYTES = limit
+
+            manifest = security.read_manifest(path)
+            self.assertEqual(len(manifest), 2)
+            self.assertEqual(manifest[0]["first"], "2025-10-16 09:00:00")
+            self.assertTrue(manifest[0]["file"].endswith(".gz"))
+            lines = list(security.read_log_lines(path))
+            self.assertEqual([line.split("ACTION: ")[1].strip() for line in lines],
+                             ["first", "second", "third"])
+
+            # A crash before the live file is removed leaves the archive listed
+            with mock.patch("security.os.remove", side_effect=OSError("crash")):
+                with self.assertRaises(OSError):
+                    writer.rotate()
+            self.assertEqual(len(security.read_manifest(path)), 3)
+
+    def test_read_log_filters(self):
+        """Test parsing and filtering log records by user, time and tail."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "audit.txt")
+            with open(path, "w", encoding="utf-8") as log_file:
+                log_file.write("[2025-10-16 09:00:00] USER: admin - ACTION: Logged in\n"
+                               "[2025-10-16 10:30:00] USER: staff - ACTION: Borrowed 91\n"
+                               "[2025-10-16 10:45:00] USER: admin - ACTION: Deleted 92\n"
+                               "[2025-10-17 08:00:00] USER: admin - ACTION: Logged out\n")
+
+            records = list(security.read_log(path))
+            self.assertEqual(records[1], security.LogRecord("2025-10-16 10:30:00", "staff", "Borrowed 91"))
+            admin = [r.action for r in security.read_log(path, user="admin")]
+            self.assertEqual(admin, ["Logged in", "Deleted 92", "Logged out"])
+            window = [r.action for r in security.read_log(path, since="2025-10-16 10:00", until="2025-10-16 10:45")]
+            self.assertEqual(window, ["Borrowed 91", "Deleted 92"])
+            day = [r.action for r in security.read_log(path, until="2025-10-16")]
+            self.assertEqual(len(day), 3)
+            last = [r.action for r in security.read_log(path, user="admin", tail=1)]
+            self.assertEqual(last, ["Logged out"])
+            last = [r.action for r in security.read_log(path, until="2025-10-16", tail=2)]
+            self.assertEqual(last, ["Borrowed 91", "Deleted 92"])
+
+            with open(path, encoding="utf-8") as log_file:
+                lines = log_file.readlines()
+            self.assertEqual(list(security.read_lines_backwards(path, block_size=7)), lines[::-1])
+
+    def test_read_log_tail_across_archives(self):
+        """Test that tail reads archives newest first and gives the same records as a full scan."""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "audit.txt")
+            writer = security.LogWriter(path, indexed=True)
+            with mock.patch("security.LOG_MODE", "buffered"):
+                for part in range(3):
+                    for n in range(5):
+                        writer.write(f"[2025-10-1{part} 10:00:0{n}] USER: u{n % 2} - ACTION: {part}-{n}\n")
+                    writer.flush()
+                    if part < 2:
+                        writer.rotate()
+            every = [r.action for r in security.read_log(path)]
+            self.assertEqual(len(every), 15)
+            for count in (0, 3, 5, 8, 20):
+                tail = [r.action for r in security.read_log(path, tail=count)]
+                self.assertEqual(tail, every[max(len(every) - count, 0):] if count else [])
+            odd = [r.action for r in security.read_log(path, user="u1")]
+            self.assertEqual([r.action for r in security.read_log(path, user="u1", tail=4)], odd[-4:])
+
+    def test_indexed_log_queries(self):
+        """Test that indexed time and user queries match a full scan."""
+        interval = security.LOG_INDEX_INTERVAL
+        security.LOG_INDEX_INTERVAL = 4
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, "audit.txt")
+                writer = security.LogWriter(path, indexed=True)
+                for minute in range(60):
+                    user = "staff" if minute % 7 == 0 else "admin"
+                    writer.write(f"[2025-10-16 10:{minute:02d}:00] USER: {user} - ACTION: step {minute}\n")
+                writer.flush()
+
+                blocks, user_blocks = security.load_log_index(path)
+                self.assertEqual(len(blocks), 15)
+                self.assertEqual(len(user_blocks["staff"]), 9)
+
+                staff = [r.action for r in security.read_log(path, user="staff")]
+                self.assertEqual(staff, [f"step {m}" for m in range(0, 60, 7)])
+                window = [r.action for r in security.read_log(path, since="2025-10-16 10:30", until="2025-10-16 10:33")]
+                self.assertEqual(window, ["step 30", "step 31", "step 32", "step 33"])
+
+                # A writer opened on an existing log without an index rebuilds it
+                # (read in small batches, as a huge log would be)
+                os.remove(security.index_file(path))
+                with mock.patch("security.LOG_INDEX_REBUILD_LINES", 5):
+                    security.LogWriter(path, indexed=True)
+                self.assertEqual(security.load_log_index(path), (blocks, user_blocks))
+        finally:
+            security.LOG_INDEX_INTERVAL = interval
+
+    def test_log_queue_drop_policies(self):
+        """Test that a full queue drops and counts records as configured."""
+        writer = security.LogWriter(os.devnull)
+        newest = security.BackgroundWriter(queue_size=2, policy="drop_newest")
+        oldest = security.BackgroundWriter(queue_size=2, policy="drop_oldest")
+        for n in range(3):
+            newest.submit(writer, n)
+            oldest.submit(writer, n)
+        self.assertEqual(newest.dropped, 1)
+        self.assertEqual(oldest.dropped, 1)
+        self.assertEqual([line for _, line in newest.queue.queue], [0, 1])
+        self.assertEqual([line for _, line in oldest.queue.queue], [1, 2])
+
+    def test_log_writer_thread_survives_errors(self):
+        """Test that a failed write neither kills the writer thread nor blocks flushing."""
+        with tempfile.TemporaryDirectory() as folder:
+            writer = security.LogWriter(os.path.join(folder, "log.txt"))
+            background = security.BackgroundWriter()
+            background.start()
+            with mock.patch.object(writer, "_write_pending", side_effect=OSError("disk full")), \
+                    mock.patch("sys.stderr", io.StringIO()):
+                background.submit(writer, "first\n")
+                background.drain()
+            self.assertEqual(background.failures, 1)
+            self.assertTrue(background.thread.is_alive())
+            background.submit(writer, "second\n")
+            background.drain()
+            background.stop()
+            with open(writer.path, encoding="utf-8") as log_file:
+                self.assertEqual(log_file.read(), "first\nsecond\n")
+
+            # If the thread has died anyway, records are written directly
+            background.thread = threading.Thread(target=lambda: None)
+            background.thread.start()
+            background.thread.join()
+            background.submit(writer, "third\n")
+            background.drain()
+            with open(writer.path, encoding="utf-8") as log_file:
+                self.assertEqual(log_file.read().splitlines()[-1], "third")
+
 
 # ==============================================
 # Run All Tests